@@ -0,0 +1,49 @@
+"""Поколения кэша: ключи фрагментов включают номер поколения области.
+
+Поколение меняется при любом изменении данных области, поэтому старые
+фрагменты просто перестают читаться и доживают до вытеснения, а новые
+можно хранить часами.
+
+Пока реплики могут не видеть записи, сменившей поколение
+(settings.REPLICA_STICKY_SECONDS), чтение поколения закрепляет запрос
+за default: фрагменты нового поколения строятся по свежим данным.
+"""
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .replicas import pin_to_primary
+
+GENERATION_KEY = 'generation:{}'
+BUMPED_KEY = 'generation-bumped:{}'
+
+
+def _new_generation():
+    # Случайное значение, а не счётчик: после вытеснения ключа поколение
+    # не повторит старое и не оживит устаревшие фрагменты.
+    return uuid4().hex[:12]
+
+
+def get_generation(scope):
+    """Текущее поколение области scope."""
+    key = GENERATION_KEY.format(scope)
+    bumped_key = BUMPED_KEY.format(scope)
+    values = cache.get_many([key, bumped_key])
+    if bumped_key in values:
+        pin_to_primary()
+    generation = values.get(key)
+    if generation is None:
+        cache.add(key, _new_generation(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(*scopes):
+    """Начинает новое поколение для каждой из областей."""
+    cache.set_many({
+        GENERATION_KEY.format(scope): _new_generation() for scope in scopes
+    }, None)
+    cache.set_many({
+        BUMPED_KEY.format(scope): True for scope in scopes
+    }, settings.REPLICA_STICKY_SECONDS)
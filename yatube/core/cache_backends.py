@@ -0,0 +1,236 @@
+"""Двухуровневый кэш: LRU в памяти процесса перед общим хранилищем.
+
+Пример настройки::
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache_backends.TwoTierCache',
+            'OPTIONS': {'SHARED': 'shared', 'LOCAL_TIMEOUT': 5},
+        },
+        'shared': {
+            'BACKEND': 'core.cache_backends.AtomicFileBasedCache',
+            'LOCATION': '/var/tmp/yatube_cache',
+        },
+    }
+
+Локальная копия отдаётся без обращения к общему хранилищу не дольше
+LOCAL_TIMEOUT секунд. Потом процесс сверяет штамп версии ключа в общем
+хранилище: совпал — копия продлевается без перечитывания значения,
+не совпал (ключ переписан или удалён другим процессом) — значение
+читается заново.
+
+add() атомарен, только если атомарен add() общего хранилища: на нём
+держатся замки single-flight. Обычный FileBasedCache проверяет и пишет
+отдельными шагами, поэтому TwoTierCache с ним add() не выполняет;
+вместо него есть AtomicFileBasedCache.
+"""
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, suppress
+from uuid import uuid4
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.exceptions import ImproperlyConfigured
+
+STAMP_SUFFIX = ':stamp'
+GUARD_SUFFIX = '.lock'
+
+
+class AtomicFileBasedCache(FileBasedCache):
+    """FileBasedCache, чей add() атомарен между процессами.
+
+    Проверка и запись add() идут под файлом-замком ключа, который
+    создаётся os.open(O_CREAT | O_EXCL): создать его может только один
+    процесс. Замок старше GUARD_TIMEOUT секунд остался от упавшего
+    процесса и снимается.
+    """
+    GUARD_TIMEOUT = 10
+    POLL_INTERVAL = 0.01
+
+    @contextmanager
+    def _guard(self, path):
+        self._createdir()
+        while True:
+            try:
+                os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                break
+            except FileExistsError:
+                try:
+                    age = time.time() - os.path.getmtime(path)
+                except FileNotFoundError:
+                    continue
+                if age > self.GUARD_TIMEOUT:
+                    with suppress(FileNotFoundError):
+                        os.remove(path)
+                    continue
+                time.sleep(self.POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            with suppress(FileNotFoundError):
+                os.remove(path)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._guard(self._key_to_file(key, version) + GUARD_SUFFIX):
+            return super().add(key, value, timeout, version)
+
+
+class TwoTierCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options.get('SHARED', 'shared')
+        self._local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        self._max_entries = options.get('LOCAL_MAX_ENTRIES', 1000)
+        self._max_bytes = options.get('LOCAL_MAX_BYTES', 16 * 1024 * 1024)
+        self._local = OrderedDict()
+        self._local_bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    # Локальный LRU
+
+    def _local_get(self, key):
+        """(значение, штамп, свежая ли копия) или None."""
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            pickled, stamp, fresh_until, expires = entry
+            now = time.monotonic()
+            if expires is not None and now >= expires:
+                self._local_pop(key)
+                return None
+            self._local.move_to_end(key)
+        return pickle.loads(pickled), stamp, now < fresh_until
+
+    def _local_set(self, key, value, stamp, timeout):
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(pickled) > self._max_bytes:
+            self._local_delete(key)
+            return
+        now = time.monotonic()
+        expires = None if timeout is None else now + timeout
+        fresh_until = now + self._local_timeout
+        if expires is not None:
+            fresh_until = min(fresh_until, expires)
+        with self._lock:
+            self._local_pop(key)
+            self._local[key] = (pickled, stamp, fresh_until, expires)
+            self._local_bytes += len(pickled)
+            while self._local and (len(self._local) > self._max_entries
+                                   or self._local_bytes > self._max_bytes):
+                self._local_pop(next(iter(self._local)))
+
+    def _local_refresh(self, key):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None:
+                pickled, stamp, _, expires = entry
+                fresh_until = time.monotonic() + self._local_timeout
+                if expires is not None:
+                    fresh_until = min(fresh_until, expires)
+                self._local[key] = (pickled, stamp, fresh_until, expires)
+
+    def _local_pop(self, key):
+        entry = self._local.pop(key, None)
+        if entry is not None:
+            self._local_bytes -= len(entry[0])
+
+    def _local_delete(self, key):
+        with self._lock:
+            self._local_pop(key)
+
+    # API кэша Django
+
+    def _timeout(self, timeout):
+        """Срок в секундах от текущего момента, как его поймёт self.
+
+        Общему хранилищу передаётся уже он: DEFAULT_TIMEOUT там означал
+        бы срок по умолчанию общего хранилища, а не этого кэша.
+        """
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is None:
+            return None
+        return max(timeout - time.time(), 0)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        shared = self.shared
+        if (isinstance(shared, FileBasedCache)
+                and not isinstance(shared, AtomicFileBasedCache)):
+            raise ImproperlyConfigured(
+                'add() у FileBasedCache не атомарен: для общего хранилища '
+                'TwoTierCache нужен core.cache_backends.AtomicFileBasedCache.')
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        timeout = self._timeout(timeout)
+        stamp = uuid4().hex
+        if not shared.add(key, (stamp, value), timeout):
+            return False
+        # Тоже add: set() другого процесса мог успеть записать свой штамп.
+        # Если штамп не встал, копии просто перечитают значение.
+        shared.add(key + STAMP_SUFFIX, stamp, timeout)
+        self._local_set(key, value, stamp, timeout)
+        return True
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        local = self._local_get(key)
+        if local is not None:
+            value, stamp, fresh = local
+            if fresh:
+                return value
+            if self.shared.get(key + STAMP_SUFFIX) == stamp:
+                self._local_refresh(key)
+                return value
+        stored = self.shared.get(key)
+        if stored is None:
+            self._local_delete(key)
+            return default
+        stamp, value = stored
+        # Срок жизни в общем хранилище неизвестен: копия живёт
+        # LOCAL_TIMEOUT и дальше сверяется по штампу.
+        self._local_set(key, value, stamp, None)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        timeout = self._timeout(timeout)
+        stamp = uuid4().hex
+        self.shared.set_many(
+            {key: (stamp, value), key + STAMP_SUFFIX: stamp}, timeout)
+        self._local_set(key, value, stamp, timeout)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        timeout = self._timeout(timeout)
+        self.shared.touch(key + STAMP_SUFFIX, timeout)
+        return self.shared.touch(key, timeout)
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self.shared.delete_many([key, key + STAMP_SUFFIX])
+        self._local_delete(key)
+
+    def has_key(self, key, version=None):
+        return self.get(key, self, version=version) is not self
+
+    def clear(self):
+        self.shared.clear()
+        with self._lock:
+            self._local.clear()
+            self._local_bytes = 0
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
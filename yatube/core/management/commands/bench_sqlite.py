@@ -0,0 +1,153 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.db import pragma_statements
+
+SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, text TEXT, '
+    'pub_date REAL, comment_count INTEGER DEFAULT 0)',
+    'CREATE INDEX post_pub_date ON post (pub_date)',
+    'CREATE TABLE comment (id INTEGER PRIMARY KEY, post_id INTEGER, '
+    'text TEXT, created REAL)',
+    'CREATE INDEX comment_post_created ON comment (post_id, created)',
+)
+FEED_SQL = ('SELECT id, text, comment_count FROM post '
+            'ORDER BY pub_date DESC LIMIT 10')
+COMMENTS_SQL = ('SELECT id, text FROM comment WHERE post_id = ? '
+                'ORDER BY created DESC')
+
+
+def _percentile(samples, share):
+    samples = sorted(samples)
+    if not samples:
+        return 0
+    return samples[min(int(len(samples) * share), len(samples) - 1)]
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает чтение и запись SQLite при всплеске комментариев: '
+            'настройки по умолчанию с соединением на запрос против '
+            'SQLITE_PRODUCTION_PRAGMAS с постоянными соединениями. '
+            'Работает на временной базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8,
+                            help='Потоков-читателей.')
+        parser.add_argument('--writers', type=int, default=2,
+                            help='Потоков, добавляющих комментарии.')
+        parser.add_argument('--seconds', type=float, default=5,
+                            help='Длительность замера каждого профиля.')
+        parser.add_argument('--posts', type=int, default=10000,
+                            help='Сколько постов в базе.')
+
+    def handle(self, *args, readers, writers, seconds, posts, **options):
+        self.stdout.write(
+            f'{"профиль":>10} {"чтений/с":>9} {"записей/с":>10} '
+            f'{"ошибок":>7} {"чтение p99, мс":>15}')
+        profiles = (
+            ('default', {}, False),
+            ('production', settings.SQLITE_PRODUCTION_PRAGMAS, True),
+        )
+        for name, pragmas, persistent in profiles:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'bench.sqlite3')
+                self._fill(path, pragmas, posts)
+                self._bench(name, path, pragmas, persistent, readers,
+                            writers, seconds, posts)
+
+    @staticmethod
+    def _connect(path, pragmas):
+        # Как у Django: автокоммит, ожидание блокировки 5 секунд.
+        connection = sqlite3.connect(path, timeout=5, isolation_level=None)
+        for statement in pragma_statements(pragmas):
+            connection.execute(statement)
+        return connection
+
+    def _fill(self, path, pragmas, posts):
+        connection = self._connect(path, pragmas)
+        for statement in SCHEMA:
+            connection.execute(statement)
+        now = time.time()
+        connection.execute('BEGIN')
+        connection.executemany(
+            'INSERT INTO post (text, pub_date) VALUES (?, ?)',
+            ((f'Пост {number}', now - number) for number in range(posts)))
+        connection.execute('COMMIT')
+        connection.close()
+
+    @staticmethod
+    def _read(connection, rng, posts):
+        connection.execute(FEED_SQL).fetchall()
+        connection.execute(
+            COMMENTS_SQL, (rng.randint(1, posts),)).fetchall()
+
+    @staticmethod
+    def _write(connection, rng, posts):
+        post_id = rng.randint(1, posts)
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute(
+                'INSERT INTO comment (post_id, text, created) '
+                'VALUES (?, ?, ?)', (post_id, 'Комментарий', time.time()))
+            connection.execute(
+                'UPDATE post SET comment_count = comment_count + 1 '
+                'WHERE id = ?', (post_id,))
+            connection.execute('COMMIT')
+        except sqlite3.Error:
+            connection.execute('ROLLBACK')
+            raise
+
+    def _worker(self, path, pragmas, persistent, operation, posts,
+                deadline, result):
+        rng = random.Random()
+        connection = None
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                if connection is None:
+                    connection = self._connect(path, pragmas)
+                operation(connection, rng, posts)
+            except sqlite3.OperationalError:
+                result['errors'] += 1
+            else:
+                result['latencies'].append(time.perf_counter() - start)
+            if not persistent and connection is not None:
+                connection.close()
+                connection = None
+        if connection is not None:
+            connection.close()
+
+    def _bench(self, name, path, pragmas, persistent, readers, writers,
+               seconds, posts):
+        deadline = time.perf_counter() + seconds
+        results = {'read': [], 'write': []}
+        threads = []
+        for kind, count, operation in (('read', readers, self._read),
+                                       ('write', writers, self._write)):
+            for _ in range(count):
+                result = {'errors': 0, 'latencies': []}
+                results[kind].append(result)
+                threads.append(threading.Thread(
+                    target=self._worker,
+                    args=(path, pragmas, persistent, operation, posts,
+                          deadline, result)))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        reads = [value for result in results['read']
+                 for value in result['latencies']]
+        writes = sum(len(result['latencies']) for result in results['write'])
+        errors = sum(result['errors']
+                     for kind in results.values() for result in kind)
+        self.stdout.write(
+            f'{name:>10} {len(reads) / seconds:>9.0f} '
+            f'{writes / seconds:>10.0f} {errors:>7} '
+            f'{_percentile(reads, 0.99) * 1000:>15.2f}')
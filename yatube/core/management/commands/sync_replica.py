@@ -0,0 +1,38 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу SQLite в реплики из REPLICA_DATABASES '
+            'через backup API. Замена репликации для локальной проверки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять копирование раз в столько секунд (0 - один раз).',
+        )
+
+    def handle(self, *args, interval, **options):
+        if not settings.REPLICA_DATABASES:
+            raise CommandError('REPLICA_DATABASES пуст: копировать некуда.')
+        source = settings.DATABASES['default']['NAME']
+        while True:
+            for alias in settings.REPLICA_DATABASES:
+                self._copy(source, settings.DATABASES[alias]['NAME'])
+                self.stdout.write(f'{alias}: скопировано')
+            if not interval:
+                break
+            time.sleep(interval)
+
+    @staticmethod
+    def _copy(source, target):
+        # backup копирует согласованный снимок, не останавливая запись.
+        src, dst = sqlite3.connect(source), sqlite3.connect(target)
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
@@ -0,0 +1,163 @@
+"""Раздача MEDIA_ROOT без CDN.
+
+Файл отдаётся FileResponse: под WSGI-сервером с wsgi.file_wrapper это
+sendfile без копирования через Python. Поддерживаются сильный ETag,
+If-None-Match, If-Modified-Since, один диапазон Range с If-Range и
+долгий Cache-Control. При MEDIA_SENDFILE = 'x-accel-redirect' или
+'x-sendfile' тело отдаёт фронтовой прокси, а вьюха только проверяет
+путь и ставит заголовки.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseNotModified,
+)
+from django.utils._os import safe_join
+from django.utils.http import http_date, quote_etag
+from django.views.static import was_modified_since
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+# posts/ab/<sha256>.ext: имя уже и есть хэш содержимого.
+CONTENT_HASH_RE = re.compile(r'([0-9a-f]{64})\.\w+$')
+CHUNK_SIZE = 64 * 1024
+
+
+class _FileRange:
+    """Файловый объект, который читает только [start, start + length)."""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def _etag(path, stat):
+    match = CONTENT_HASH_RE.search(path)
+    if match:
+        return quote_etag(match.group(1))
+    return quote_etag(f'{stat.st_size:x}-{stat.st_mtime_ns:x}')
+
+
+def _cache_control(path):
+    cache_control = f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}'
+    if CONTENT_HASH_RE.search(path):
+        # Под этим именем другое содержимое не появится никогда.
+        cache_control += ', immutable'
+    return cache_control
+
+
+def _byte_range(header, size):
+    """(start, end) включительно, None - отдать целиком, ValueError - 416.
+
+    Несколько диапазонов не поддерживаются: RFC 7233 разрешает тогда
+    отдать файл целиком.
+    """
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError
+    return start, end
+
+
+def _sendfile_response(path, content_type):
+    response = HttpResponse(content_type=content_type)
+    if settings.MEDIA_SENDFILE == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = (
+            settings.MEDIA_ACCEL_PREFIX.rstrip('/') + '/' + path)
+    else:
+        response['X-Sendfile'] = safe_join(settings.MEDIA_ROOT, path)
+    return response
+
+
+def serve_media(request, path):
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('Файл не найден.')
+    try:
+        stat = os.stat(fullpath)
+    except OSError:
+        raise Http404('Файл не найден.')
+    if not os.path.isfile(fullpath):
+        raise Http404('Файл не найден.')
+    etag = _etag(path, stat)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': _cache_control(path),
+        'Accept-Ranges': 'bytes',
+    }
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        # Для If-None-Match сравнение слабое: W/ не мешает совпадению.
+        tags = {tag.strip().replace('W/', '', 1)
+                for tag in if_none_match.split(',')}
+        not_modified = '*' in tags or etag in tags
+    else:
+        not_modified = not was_modified_since(
+            request.META.get('HTTP_IF_MODIFIED_SINCE'),
+            stat.st_mtime, stat.st_size)
+    if not_modified:
+        response = HttpResponseNotModified()
+    elif settings.MEDIA_SENDFILE:
+        # Range и If-Range прокси разбирает сам.
+        content_type, _ = mimetypes.guess_type(fullpath)
+        response = _sendfile_response(
+            path, content_type or 'application/octet-stream')
+    else:
+        response = _file_response(request, fullpath, stat.st_size, etag)
+    for header, value in headers.items():
+        response[header] = value
+    return response
+
+
+def _file_response(request, fullpath, size, etag):
+    content_type, encoding = mimetypes.guess_type(fullpath)
+    content_type = content_type or 'application/octet-stream'
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if range_header and (if_range is None or if_range == etag):
+        try:
+            byte_range = _byte_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+    file = open(fullpath, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = FileResponse(_FileRange(file, start, length),
+                                content_type=content_type, status=206)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(length)
+    response.block_size = CHUNK_SIZE
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return response
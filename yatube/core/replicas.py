@@ -0,0 +1,100 @@
+"""Чтение лент с реплик и запись в основную базу.
+
+Вьюхи лент помечены replica_reads: их чтения ReplicaRouter отправляет
+на одну из баз settings.REPLICA_DATABASES, все записи идут в default.
+Кто только что что-то записал, ещё settings.REPLICA_STICKY_SECONDS
+читает из default: ReplicaStickinessMiddleware ставит ему подписанную
+куку, и свою запись он увидит, даже если реплика отстаёт.
+
+Так же долго после смены поколения области кэша (core.cache) её читают
+из default все: иначе первый читатель с отстающей реплики наполнил бы
+фрагменты и ETag нового поколения старыми данными на часы.
+"""
+import contextvars
+import random
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+
+PRIMARY = 'default'
+STICKY_COOKIE = 'primary_reads'
+
+_pinned = contextvars.ContextVar('pinned_to_primary', default=False)
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+_wrote = contextvars.ContextVar('wrote', default=False)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and settings.REPLICA_DATABASES:
+            return random.choice(settings.REPLICA_DATABASES)
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Реплики - копии default, схему им приносит sync_replica.
+        return db == PRIMARY
+
+
+def replica_reads(view):
+    """Чтения вьюхи идут на реплику, если запрос не закреплён за default."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = _replica_reads.set(not _pinned.get())
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _replica_reads.reset(token)
+    return wrapper
+
+
+def pin_to_primary():
+    """Остаток вьюхи с replica_reads читает из default."""
+    _replica_reads.set(False)
+
+
+@contextmanager
+def primary_reads(sticky=True):
+    """Чтения блока идут в default даже во вьюхе с replica_reads.
+
+    sticky=False - записи блока служебные (например, ленивое создание
+    строки по данным default) и не закрепляют клиента за default.
+    """
+    reads = _replica_reads.set(False)
+    wrote = _wrote.get()
+    try:
+        yield
+    finally:
+        _replica_reads.reset(reads)
+        if not sticky:
+            _wrote.set(wrote)
+
+
+class ReplicaStickinessMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sticky = request.get_signed_cookie(
+            STICKY_COOKIE, default=None,
+            max_age=settings.REPLICA_STICKY_SECONDS) is not None
+        pinned = _pinned.set(sticky)
+        wrote = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            if _wrote.get():
+                response.set_signed_cookie(
+                    STICKY_COOKIE, '1',
+                    max_age=settings.REPLICA_STICKY_SECONDS,
+                    httponly=True, samesite='Lax')
+        finally:
+            _wrote.reset(wrote)
+            _pinned.reset(pinned)
+        return response
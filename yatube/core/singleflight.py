@@ -0,0 +1,148 @@
+"""Single-flight для промахов кэша.
+
+Когда дорогое значение пропадает из кэша, пересчитывает его только один
+вызывающий: внутри процесса — держатель потокового замка, между
+процессами — тот, кто первым положил замок в общий кэш (cache.add).
+Остальные получают устаревшее значение, если оно ещё хранится, или
+ждут, пока посчитанное появится в кэше.
+
+Значение хранится парой (значение, мягкий срок). После мягкого срока
+запись живёт ещё stale_timeout секунд, и её можно отдавать, пока
+кто-то один считает свежую.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache as default_cache
+from django.http import HttpResponse
+
+from .cache import get_generation
+
+LOCK_KEY = 'singleflight-lock:{}'
+LOCK_TIMEOUT = 30
+POLL_INTERVAL = 0.05
+WAIT_TIMEOUT = 10
+
+# Потоковый замок на каждый ключ: key -> [замок, число пользователей].
+# Запись живёт, пока замком кто-то пользуется.
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+@contextmanager
+def _thread_lock(key):
+    with _locks_guard:
+        entry = _locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        yield entry[0]
+    finally:
+        with _locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _locks[key]
+
+
+def _store(cache, key, compute, timeout, stale_timeout):
+    value = compute()
+    soft_expires = None if timeout is None else time.time() + timeout
+    hard_timeout = None if timeout is None else timeout + stale_timeout
+    cache.set(key, (value, soft_expires), hard_timeout)
+    return value
+
+
+def _compute_once(cache, key, compute, timeout, stale_timeout):
+    """Считает значение, если удалось взять межпроцессный замок."""
+    lock_key = LOCK_KEY.format(key)
+    if not cache.add(lock_key, True, LOCK_TIMEOUT):
+        return False, None
+    try:
+        return True, _store(cache, key, compute, timeout, stale_timeout)
+    finally:
+        cache.delete(lock_key)
+
+
+def _wait_for(cache, key, wait):
+    """Ждёт, пока значение посчитает процесс, держащий замок.
+
+    None - замок отпущен без значения или ждать дольше нельзя.
+    """
+    lock_key = LOCK_KEY.format(key)
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+        if cache.get(lock_key) is None:
+            return cache.get(key)
+        time.sleep(POLL_INTERVAL)
+    return None
+
+
+def get_or_compute(key, compute, timeout, stale_timeout=None, cache=None,
+                   wait=WAIT_TIMEOUT):
+    """Значение key из кэша; при промахе compute() вызывается один раз."""
+    cache = cache or default_cache
+    if stale_timeout is None:
+        stale_timeout = timeout or 0
+    entry = cache.get(key)
+    if entry is not None and (entry[1] is None or entry[1] > time.time()):
+        return entry[0]
+    with _thread_lock(key) as thread_lock:
+        if thread_lock.acquire(blocking=False):
+            try:
+                computed, value = _compute_once(
+                    cache, key, compute, timeout, stale_timeout)
+            finally:
+                thread_lock.release()
+            if computed:
+                return value
+            # Считает другой процесс: его замок в общем кэше.
+            if entry is None:
+                entry = _wait_for(cache, key, wait)
+        elif entry is None and thread_lock.acquire(timeout=wait):
+            # Значение считал соседний поток: замок отпущен, оно в кэше.
+            thread_lock.release()
+            entry = cache.get(key)
+    if entry is None:
+        return _store(cache, key, compute, timeout, stale_timeout)
+    return entry[0]
+
+
+def cache_feed_page(scope):
+    """Кэширует страницу ленты для анонимных читателей через single-flight.
+
+    scope(**kwargs) по аргументам вьюхи называет область кэша, поколение
+    которой входит в ключ. Выключено, пока FEED_VIEW_CACHE_TIMEOUT == 0.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            timeout = settings.FEED_VIEW_CACHE_TIMEOUT
+            if (not timeout or request.method != 'GET'
+                    or request.user.is_authenticated):
+                return view(request, *args, **kwargs)
+            generation = get_generation(scope(**kwargs))
+            key = f'feed-page:{generation}:{request.get_full_path()}'
+            rendered = {}
+
+            def render():
+                response = view(request, *args, **kwargs)
+                rendered['response'] = response
+                if response.status_code != 200 or response.streaming:
+                    return None
+                return response.content, response['Content-Type']
+
+            page = get_or_compute(key, render, timeout)
+            if 'response' in rendered:
+                return rendered['response']
+            if page is None:
+                # Кэшируются только успешные ответы.
+                return view(request, *args, **kwargs)
+            content, content_type = page
+            return HttpResponse(content, content_type=content_type)
+        return wrapper
+    return decorator
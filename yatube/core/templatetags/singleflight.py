@@ -0,0 +1,59 @@
+from django import template
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.template import TemplateSyntaxError, VariableDoesNotExist
+from django.templatetags.cache import CacheNode
+
+from core.singleflight import get_or_compute
+
+register = template.Library()
+
+
+class SingleFlightCacheNode(CacheNode):
+    """{% cache %}, у которого промах пересчитывает один запрос."""
+
+    def render(self, context):
+        try:
+            expire_time = self.expire_time_var.resolve(context)
+        except VariableDoesNotExist:
+            raise TemplateSyntaxError(
+                '"singleflight_cache" tag got an unknown variable: %r'
+                % self.expire_time_var.var)
+        if expire_time is not None:
+            expire_time = int(expire_time)
+        cache_name = 'template_fragments'
+        if self.cache_name:
+            cache_name = self.cache_name.resolve(context)
+        try:
+            fragment_cache = caches[cache_name]
+        except InvalidCacheBackendError:
+            if self.cache_name:
+                raise TemplateSyntaxError(
+                    'Invalid cache name specified for cache tag: %r'
+                    % cache_name)
+            fragment_cache = caches['default']
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        # Свой префикс: записи хранятся парой со сроком, а не строкой.
+        key = 'singleflight:' + make_template_fragment_key(
+            self.fragment_name, vary_on)
+        return get_or_compute(
+            key, lambda: self.nodelist.render(context), expire_time,
+            cache=fragment_cache)
+
+
+@register.tag('singleflight_cache')
+def do_singleflight_cache(parser, token):
+    """Как {% cache %}: {% singleflight_cache время имя [var ...] %}."""
+    nodelist = parser.parse(('endsingleflight_cache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 3:
+        raise TemplateSyntaxError(
+            "'%r' tag requires at least 2 arguments." % tokens[0])
+    cache_name = None
+    if len(tokens) > 3 and tokens[-1].startswith('using='):
+        cache_name = parser.compile_filter(tokens.pop()[len('using='):])
+    return SingleFlightCacheNode(
+        nodelist, parser.compile_filter(tokens[1]), tokens[2],
+        [parser.compile_filter(var) for var in tokens[3:]], cache_name,
+    )
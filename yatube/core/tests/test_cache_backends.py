@@ -0,0 +1,122 @@
+import os
+import tempfile
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.template import Context, Template
+from django.test import SimpleTestCase, override_settings
+
+from ..cache_backends import GUARD_SUFFIX, AtomicFileBasedCache, TwoTierCache
+
+SHARED_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'two-tier-tests',
+    },
+}
+
+
+def two_tier(**options):
+    return TwoTierCache('', {'OPTIONS': {'SHARED': 'shared', **options}})
+
+
+@override_settings(CACHES=SHARED_CACHES)
+class TwoTierCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.first = two_tier(LOCAL_TIMEOUT=60)
+        self.second = two_tier(LOCAL_TIMEOUT=60)
+        self.first.clear()
+
+    def test_value_shared_between_processes(self):
+        """Значение, записанное одним процессом, видно другому."""
+        self.first.set('key', {'posts': [1, 2]})
+        self.assertEqual(self.second.get('key'), {'posts': [1, 2]})
+
+    def test_local_copy_revalidated_by_stamp(self):
+        """Устаревшая локальная копия сверяется со штампом версии."""
+        revalidating = two_tier(LOCAL_TIMEOUT=0)
+        self.first.set('key', 'old')
+        self.second.get('key')
+        revalidating.get('key')
+        self.first.set('key', 'new')
+        self.assertEqual(self.second.get('key'), 'old')
+        self.assertEqual(revalidating.get('key'), 'new')
+        self.first.delete('key')
+        self.assertIsNone(revalidating.get('key'))
+
+    def test_default_timeout_is_own(self):
+        """Срок по умолчанию - свой, а не общего хранилища."""
+        cache = TwoTierCache('', {'TIMEOUT': 0,
+                                  'OPTIONS': {'SHARED': 'shared'}})
+        cache.set('key', 'value')
+        self.assertTrue(cache.add('other', 'value'))
+        self.assertIsNone(self.first.get('key'))
+        self.assertIsNone(self.first.get('other'))
+
+    def test_non_atomic_shared_add_refused(self):
+        """add() поверх обычного FileBasedCache запрещён."""
+        with tempfile.TemporaryDirectory() as directory:
+            caches = {**SHARED_CACHES, 'shared': {
+                'BACKEND':
+                    'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': directory,
+            }}
+            with override_settings(CACHES=caches):
+                with self.assertRaises(ImproperlyConfigured):
+                    two_tier().add('key', 'value')
+
+    def test_local_lru_bounded(self):
+        """Локальный уровень ограничен числом записей."""
+        cache = two_tier(LOCAL_MAX_ENTRIES=2)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key)
+        self.assertEqual(len(cache._local), 2)
+        self.assertEqual(cache.get('a'), 'a')
+
+    def test_fragment_cache_tag(self):
+        """Бэкенд работает с шаблонным тегом {% cache %}."""
+        with override_settings(CACHES={
+                **SHARED_CACHES,
+                'default': {'BACKEND': 'core.cache_backends.TwoTierCache'}}):
+            template = Template(
+                '{% load cache %}{% cache 60 frag %}{{ value }}'
+                '{% endcache %}')
+            self.assertEqual(template.render(Context({'value': 1})), '1')
+            self.assertEqual(template.render(Context({'value': 2})), '1')
+
+
+class AtomicFileBasedCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = AtomicFileBasedCache(directory.name, {})
+
+    def test_add_once_across_threads(self):
+        """Из одновременных add() одного ключа удаётся ровно один."""
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                AtomicFileBasedCache(self.cache._dir, {}).add('key', 1, 30)))
+            for _ in range(16)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results.count(True), 1)
+        self.assertFalse(os.path.exists(
+            self.cache._key_to_file('key') + GUARD_SUFFIX))
+
+    def test_stale_guard_removed(self):
+        """Замок упавшего процесса не держит ключ вечно."""
+        guard = self.cache._key_to_file('key') + GUARD_SUFFIX
+        os.makedirs(os.path.dirname(guard), exist_ok=True)
+        open(guard, 'w').close()
+        stale = os.path.getmtime(guard) - self.cache.GUARD_TIMEOUT - 1
+        os.utime(guard, (stale, stale))
+        self.assertTrue(self.cache.add('key', 1))
+        self.assertFalse(self.cache.add('key', 2))
+        self.assertEqual(self.cache.get('key'), 1)
@@ -0,0 +1,25 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from core.db import apply_pragmas
+
+
+class SqlitePragmasTests(TestCase):
+    def busy_timeout(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied_to_new_connection(self):
+        """PRAGMA из настроек выполняются, пустые ничего не меняют."""
+        before = self.busy_timeout()
+        with override_settings(SQLITE_PRAGMAS={}):
+            apply_pragmas(None, connection)
+        self.assertEqual(self.busy_timeout(), before)
+        try:
+            with override_settings(SQLITE_PRAGMAS={'busy_timeout': 1234}):
+                apply_pragmas(None, connection)
+            self.assertEqual(self.busy_timeout(), 1234)
+        finally:
+            with override_settings(SQLITE_PRAGMAS={'busy_timeout': before}):
+                apply_pragmas(None, connection)
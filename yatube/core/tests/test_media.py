@@ -0,0 +1,77 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+HASHED = 'posts/ab/' + 'ab' * 32 + '.txt'
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, MEDIA_SENDFILE='')
+class ServeMediaTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        path = f'{TEMP_MEDIA_ROOT}/posts/ab'
+        shutil.os.makedirs(path)
+        with open(f'{TEMP_MEDIA_ROOT}/{HASHED}', 'wb') as file:
+            file.write(b'0123456789')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def get(self, path=HASHED, **headers):
+        return self.client.get(settings.MEDIA_URL + path, **headers)
+
+    def test_full_file_with_cache_headers(self):
+        """Файл отдаётся целиком с ETag из хэша и долгим кэшем."""
+        response = self.get()
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['ETag'], '"%s"' % ('ab' * 32))
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_conditional_requests(self):
+        """Совпавший ETag или неизменённый файл дают 304."""
+        response = self.get()
+        cases = (
+            {'HTTP_IF_NONE_MATCH': response['ETag']},
+            {'HTTP_IF_MODIFIED_SINCE': response['Last-Modified']},
+        )
+        for headers in cases:
+            with self.subTest(headers=headers):
+                self.assertEqual(self.get(**headers).status_code, 304)
+
+    def test_ranges(self):
+        """Диапазоны отдаются с 206, невыполнимый - 416."""
+        cases = (
+            ('bytes=2-4', b'234', 'bytes 2-4/10'),
+            ('bytes=7-', b'789', 'bytes 7-9/10'),
+            ('bytes=-2', b'89', 'bytes 8-9/10'),
+        )
+        for header, body, content_range in cases:
+            with self.subTest(header=header):
+                response = self.get(HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(b''.join(response.streaming_content), body)
+                self.assertEqual(response['Content-Range'], content_range)
+        self.assertEqual(self.get(HTTP_RANGE='bytes=20-').status_code, 416)
+        response = self.get(HTTP_RANGE='bytes=2-4', HTTP_IF_RANGE='"old"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_missing_and_outside_paths(self):
+        """Отсутствующий файл и выход за MEDIA_ROOT - 404."""
+        for path in ('posts/none.txt', '../settings.py', 'posts'):
+            with self.subTest(path=path):
+                self.assertEqual(self.get(path).status_code, 404)
+
+    @override_settings(MEDIA_SENDFILE='x-accel-redirect')
+    def test_accel_redirect(self):
+        """В режиме прокси тело не отдаётся, путь - в заголовке."""
+        response = self.get()
+        self.assertEqual(response['X-Accel-Redirect'],
+                         settings.MEDIA_ACCEL_PREFIX + HASHED)
+        self.assertEqual(response.content, b'')
@@ -0,0 +1,111 @@
+import os
+import sqlite3
+import tempfile
+
+from django.core.cache import cache
+from django.db import router
+from django.db.utils import ConnectionDoesNotExist
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from core.management.commands.sync_replica import Command as SyncReplica
+from core.cache import bump_generation, get_generation
+from core.replicas import (
+    STICKY_COOKIE, ReplicaStickinessMiddleware, primary_reads, replica_reads,
+)
+from posts.models import Post, User
+
+
+# Несуществующий псевдоним: чтение с реплики в тесте сразу заметно.
+@override_settings(REPLICA_DATABASES=['missing'])
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_routing_and_stickiness(self):
+        """Ленты читают реплику, пока пользователь ничего не записал."""
+        seen = []
+
+        @replica_reads
+        def view(request):
+            seen.append(router.db_for_read(Post))
+            if request.GET.get('write'):
+                router.db_for_write(Post)
+            return HttpResponse()
+
+        middleware = ReplicaStickinessMiddleware(view)
+        factory = RequestFactory()
+        response = middleware(factory.get('/'))
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+        response = middleware(factory.get('/', {'write': '1'}))
+        cookie = response.cookies[STICKY_COOKIE]
+        request = factory.get('/')
+        request.COOKIES[STICKY_COOKIE] = cookie.value
+        middleware(request)
+        self.assertEqual(seen, ['missing', 'missing', 'default'])
+        self.assertEqual(router.db_for_read(Post), 'default')
+        self.assertEqual(router.db_for_write(Post), 'default')
+
+    def test_primary_reads_block(self):
+        """Блок primary_reads читает default; служебная запись не липнет."""
+        seen = []
+
+        @replica_reads
+        def view(request):
+            with primary_reads(sticky=False):
+                seen.append(router.db_for_read(Post))
+                router.db_for_write(Post)
+            seen.append(router.db_for_read(Post))
+            return HttpResponse()
+
+        response = ReplicaStickinessMiddleware(view)(
+            RequestFactory().get('/'))
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+        self.assertEqual(seen, ['default', 'missing'])
+
+    def test_fresh_generation_read_from_primary(self):
+        """Сразу после смены поколения область читают из default все."""
+        seen = []
+
+        @replica_reads
+        def view(request):
+            get_generation('scope')
+            seen.append(router.db_for_read(Post))
+            return HttpResponse()
+
+        view(RequestFactory().get('/'))
+        bump_generation('scope')
+        view(RequestFactory().get('/'))
+        with self.settings(REPLICA_STICKY_SECONDS=0):
+            bump_generation('scope')
+        view(RequestFactory().get('/'))
+        self.assertEqual(seen, ['missing', 'default', 'missing'])
+
+    def test_author_sees_own_post(self):
+        """После публикации ленты автора читаются из default."""
+        client = Client()
+        with self.assertRaises(ConnectionDoesNotExist):
+            client.get(reverse('posts:index'))
+        client.force_login(User.objects.create_user(username='auth'))
+        client.post(reverse('posts:post_create'), {'text': 'Свежий'})
+        response = client.get(reverse('posts:index'))
+        self.assertContains(response, 'Свежий')
+
+
+class SyncReplicaCommandTests(TestCase):
+    def test_copy(self):
+        """Реплика получает снимок основной базы."""
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, 'db.sqlite3')
+            target = os.path.join(directory, 'replica.sqlite3')
+            connection = sqlite3.connect(source)
+            connection.execute('CREATE TABLE item (name TEXT)')
+            connection.execute("INSERT INTO item VALUES ('x')")
+            connection.commit()
+            connection.close()
+            SyncReplica._copy(source, target)
+            connection = sqlite3.connect(target)
+            rows = connection.execute('SELECT name FROM item').fetchall()
+            connection.close()
+        self.assertEqual(rows, [('x',)])
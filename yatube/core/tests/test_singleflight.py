@@ -0,0 +1,120 @@
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.template import Context, Template
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+from ..singleflight import LOCK_KEY, get_or_compute
+
+User = get_user_model()
+
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self, value='fresh', delay=0):
+        def inner():
+            self.calls += 1
+            time.sleep(delay)
+            return value
+        return inner
+
+    def test_concurrent_misses_compute_once(self):
+        """Одновременные промахи по одному ключу считают значение раз."""
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(get_or_compute(
+                'key', self.compute(delay=0.2), 60)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, ['fresh'] * 8)
+
+    def test_other_keys_not_blocked(self):
+        """Промах по другому ключу не ждёт чужого вычисления."""
+        slow = threading.Thread(target=get_or_compute,
+                                args=('a', self.compute(delay=1), 60))
+        slow.start()
+        time.sleep(0.1)
+        started = time.monotonic()
+        for number in range(64):
+            get_or_compute(f'b{number}', self.compute(), 60, wait=3)
+        self.assertLess(time.monotonic() - started, 0.5)
+        slow.join()
+
+    def test_stale_value_served_while_recomputing(self):
+        """Пока другой процесс считает, отдаётся устаревшее значение."""
+        cache.set('key', ('stale', time.time() - 1), 60)
+        cache.add(LOCK_KEY.format('key'), True, 30)
+        self.assertEqual(get_or_compute('key', self.compute(), 60), 'stale')
+        self.assertEqual(self.calls, 0)
+
+    def test_expired_value_recomputed(self):
+        """Просроченное значение пересчитывается при свободном замке."""
+        cache.set('key', ('stale', time.time() - 1), 60)
+        self.assertEqual(get_or_compute('key', self.compute(), 60), 'fresh')
+        self.assertEqual(get_or_compute('key', self.compute(), 60), 'fresh')
+        self.assertEqual(self.calls, 1)
+        self.assertIsNone(cache.get(LOCK_KEY.format('key')))
+
+    def test_template_tag(self):
+        """{% singleflight_cache %} кэширует фрагмент как {% cache %}."""
+        template = Template(
+            '{% load singleflight %}{% singleflight_cache 60 frag %}'
+            '{{ value }}{% endsingleflight_cache %}')
+        self.assertEqual(template.render(Context({'value': 1})), '1')
+        self.assertEqual(template.render(Context({'value': 2})), '1')
+
+
+@override_settings(FEED_VIEW_CACHE_TIMEOUT=60)
+class FeedPageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.create(author=cls.user, text='Первый пост')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_page_cached_until_write(self):
+        """Страница для анонимов кэшируется до изменения ленты."""
+        url = reverse('posts:index')
+        self.client.get(url)
+        Post.objects.bulk_create(
+            [Post(author=self.user, text='Второй пост')])
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertNotContains(response, 'Второй пост')
+        Post.objects.get(text='Второй пост').save()
+        self.assertContains(self.client.get(url), 'Второй пост')
+
+    def test_authorized_page_not_cached(self):
+        """Авторизованному пользователю страница строится заново."""
+        self.client.force_login(self.user)
+        self.client.get(reverse('posts:profile', args=('auth',)))
+        response = self.client.get(reverse('posts:profile', args=('auth',)))
+        self.assertIn('page_obj', response.context)
+
+    def test_profile_page_reset_by_follow(self):
+        """Подписка и отписка меняют счётчики на кэшированном профиле."""
+        url = reverse('posts:profile', args=('auth',))
+        reader = Client()
+        reader.force_login(User.objects.create_user(username='reader'))
+        self.client.get(url)
+        reader.get(reverse('posts:profile_follow', args=('auth',)))
+        self.assertContains(
+            self.client.get(url), 'Подписано на автора пользователей: 1')
+        reader.get(reverse('posts:profile_unfollow', args=('auth',)))
+        self.assertContains(
+            self.client.get(url), 'Подписано на автора пользователей: 0')
@@ -0,0 +1,14 @@
+"""Запуск Django в процессах пула (spawn).
+
+Функция импортируется дочерним процессом до django.setup, поэтому модуль
+не трогает приложения и модели.
+"""
+import django
+from django.conf import settings
+
+
+def setup(overrides):
+    """Настройки родителя поверх модуля настроек, затем django.setup."""
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+    django.setup()
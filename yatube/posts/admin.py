@@ -1,10 +1,19 @@
 from django.contrib import admin
+from django.db.models import Q
 
-from .models import Post, Group, Follow
+from . import search
+from .models import Post, Group, Follow, User
+from .paginators import EstimatedCountPaginator
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Список без COUNT(*) по всей таблице: число строк - оценка."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Post)
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(LargeTableAdmin):
     list_display = (
         'pk',
         'text',
@@ -17,9 +26,13 @@ class PostAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
     list_editable = ('group',)
 
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по тексту идёт через индекс FTS5, а не LIKE."""
+        return search.filter_posts(queryset, search_term), False
+
 
 @admin.register(Group)
-class GroupAdmin(admin.ModelAdmin):
+class GroupAdmin(LargeTableAdmin):
     list_display = (
         'pk',
         'title',
@@ -29,11 +42,34 @@ class GroupAdmin(admin.ModelAdmin):
     search_fields = ('title',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Точный slug находится по уникальному индексу."""
+        search_term = search_term.strip()
+        if search_term and queryset.filter(slug=search_term).exists():
+            return queryset.filter(slug=search_term), False
+        return super().get_search_results(request, queryset, search_term)
+
 
 @admin.register(Follow)
-class GroupAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableAdmin):
     list_display = (
         'pk',
         'user',
         'author',
     )
+    list_select_related = ('user', 'author')
+    search_fields = ('user__username', 'author__username')
+
+    def get_search_results(self, request, queryset, search_term):
+        """Подписки и подписчики пользователя с точным именем.
+
+        Имя ищется по уникальному индексу username, подписки - по
+        индексам внешних ключей.
+        """
+        usernames = search_term.split()
+        if not usernames:
+            return queryset, False
+        user_ids = list(User.objects.filter(
+            username__in=usernames).values_list('pk', flat=True))
+        return queryset.filter(
+            Q(user__in=user_ids) | Q(author__in=user_ids)), False
@@ -0,0 +1,199 @@
+"""Автодополнение имён пользователей и групп по префиксу.
+
+Каждый процесс держит в памяти отсортированные списки ключей (имя в
+casefold) и находит диапазон с префиксом бинарным поиском: запрос
+стоит O(log n + limit). Индекс строится при первом запросе.
+
+Сигналы User и Group меняют поколения в общем кэше. После создания
+процесс при следующем запросе дочитывает строки с pk больше уже
+известного и вливает их в индекс, а после переименования или удаления
+строит индекс заново: это редко. Строка, закоммиченная позже строки с
+большим pk, могла быть пропущена дочитыванием; её коммит считается
+изменением и тоже перестраивает индексы.
+"""
+import bisect
+import heapq
+import threading
+
+from django.conf import settings
+from django.db import transaction
+
+from core.cache import bump_generation, get_generation
+from .models import Group, User
+
+ADDED_SCOPE = 'autocomplete:added'
+CHANGED_SCOPE = 'autocomplete:changed'
+
+
+def _key(text):
+    return text.casefold()
+
+
+class PrefixIndex:
+    """Отсортированные пары (ключ, значение) с поиском по префиксу."""
+
+    def __init__(self, pairs=()):
+        pairs = sorted(pairs)
+        self.keys = [key for key, _ in pairs]
+        self.values = [value for _, value in pairs]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def merged(self, pairs):
+        """Новый индекс с добавленными парами; этот не меняется.
+
+        Сортируются только новые пары, с индексом они сливаются за
+        линейное время.
+        """
+        index = PrefixIndex()
+        for key, value in heapq.merge(
+                zip(self.keys, self.values), sorted(pairs)):
+            index.keys.append(key)
+            index.values.append(value)
+        return index
+
+    def search(self, prefix, limit):
+        """До limit разных значений, чьи ключи начинаются с prefix."""
+        found = []
+        position = bisect.bisect_left(self.keys, prefix)
+        while (len(found) < limit and position < len(self.keys)
+               and self.keys[position].startswith(prefix)):
+            value = self.values[position]
+            if value not in found:
+                found.append(value)
+            position += 1
+        return found
+
+
+def _rows(queryset, seen):
+    """Строки с pk больше seen[0]; seen[0] растёт до наибольшего pk."""
+    for row in queryset.filter(pk__gt=seen[0]).iterator():
+        seen[0] = max(seen[0], row[0])
+        yield row
+
+
+def _user_pairs(rows):
+    for _, username in rows:
+        # Тот же объект строки, если имя уже в нижнем регистре.
+        key = _key(username)
+        yield (username if key == username else key), username
+
+
+def _group_pairs(rows):
+    for _, slug, title in rows:
+        yield _key(slug), (slug, title)
+        yield _key(title), (slug, title)
+
+
+class Snapshot:
+    """Индексы и то, до чего они дочитаны; после сборки не меняется."""
+
+    def __init__(self, generations, users, groups, users_seen, groups_seen):
+        self.generations = generations
+        self.users = users
+        self.groups = groups
+        self.users_seen = users_seen
+        self.groups_seen = groups_seen
+
+
+class Autocomplete:
+    """Индексы пользователей и групп одного процесса.
+
+    Новый снимок строит один поток вне self.lock, остальные тем временем
+    отвечают по прежнему; под замком снимок только подменяется.
+    """
+    users_queryset = User.objects.values_list('pk', 'username')
+    groups_queryset = Group.objects.values_list('pk', 'slug', 'title')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.building = threading.Lock()
+        self.snapshot = None
+
+    @staticmethod
+    def _generations():
+        return get_generation(ADDED_SCOPE), get_generation(CHANGED_SCOPE)
+
+    def _rebuild(self, generations):
+        users_seen, groups_seen = [0], [0]
+        return Snapshot(
+            generations,
+            PrefixIndex(_user_pairs(_rows(self.users_queryset, users_seen))),
+            PrefixIndex(_group_pairs(
+                _rows(self.groups_queryset, groups_seen))),
+            users_seen[0], groups_seen[0])
+
+    def _catch_up(self, generations, base):
+        """Дочитывает строки с pk больше известного в новые индексы."""
+        users_seen, groups_seen = [base.users_seen], [base.groups_seen]
+        users = base.users.merged(_user_pairs(
+            _rows(self.users_queryset, users_seen)))
+        groups = base.groups.merged(_group_pairs(
+            _rows(self.groups_queryset, groups_seen)))
+        return Snapshot(
+            generations, users, groups, users_seen[0], groups_seen[0])
+
+    def _current(self):
+        generations = self._generations()
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot.generations == generations:
+            return snapshot
+        # Пока другой поток строит снимок, отвечаем прежним.
+        if not self.building.acquire(blocking=snapshot is None):
+            return snapshot
+        try:
+            snapshot = self.snapshot
+            if snapshot is None or snapshot.generations != generations:
+                if (snapshot is None
+                        or snapshot.generations[1] != generations[1]):
+                    snapshot = self._rebuild(generations)
+                else:
+                    snapshot = self._catch_up(generations, snapshot)
+                with self.lock:
+                    self.snapshot = snapshot
+            return snapshot
+        finally:
+            self.building.release()
+
+    def suggest(self, prefix, limit):
+        """Имена пользователей и пары (slug, title) групп по префиксу."""
+        prefix = _key(prefix.strip())
+        if not prefix:
+            return [], []
+        snapshot = self._current()
+        return (snapshot.users.search(prefix, limit),
+                snapshot.groups.search(prefix, limit))
+
+
+def _bump_added(instance):
+    # Строка с большим pk уже видна: дочитывание по pk могло пройти мимо
+    # этой, и индексы надо строить заново.
+    late = type(instance)._default_manager.filter(
+        pk__gt=instance.pk).exists()
+    bump_generation(CHANGED_SCOPE if late else ADDED_SCOPE)
+
+
+def added(instance):
+    """Новую строку процессы дочитают при следующем запросе.
+
+    Поколение меняется сразу, для своей транзакции, и ещё раз после
+    коммита: до него другие процессы строку не видели.
+    """
+    _bump_added(instance)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump_added(instance))
+
+
+def changed():
+    """Переименование или удаление: индексы всех процессов устарели."""
+    bump_generation(CHANGED_SCOPE)
+
+
+autocomplete = Autocomplete()
+
+
+def suggest(prefix, limit=None):
+    limit = min(limit or settings.AUTOCOMPLETE_LIMIT,
+                settings.AUTOCOMPLETE_LIMIT)
+    return autocomplete.suggest(prefix, limit)
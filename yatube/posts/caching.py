@@ -0,0 +1,33 @@
+"""Области кэша лент: главная, группа, автор."""
+from core.cache import bump_generation, get_generation
+
+INDEX_SCOPE = 'index'
+
+
+def group_scope(slug):
+    return f'group:{slug}'
+
+
+def author_scope(username):
+    return f'author:{username}'
+
+
+def index_generation():
+    return get_generation(INDEX_SCOPE)
+
+
+def group_generation(slug):
+    return get_generation(group_scope(slug))
+
+
+def author_generation(username):
+    return get_generation(author_scope(username))
+
+
+def invalidate_feeds(username=None, *group_slugs):
+    """Сбрасывает фрагменты главной и затронутых автора и групп."""
+    scopes = [INDEX_SCOPE]
+    if username:
+        scopes.append(author_scope(username))
+    scopes.extend(group_scope(slug) for slug in group_slugs if slug)
+    bump_generation(*scopes)
@@ -0,0 +1,65 @@
+"""Валидаторы условных GET для лент и страницы поста.
+
+ETag считается без запроса страницы: для лент берётся поколение области
+кэша, для профиля и поста добавляется одна строка счётчиков. В ETag
+входит пользователь: шапка и кнопки у каждого свои, поэтому 304 не
+отдаст чужую или устаревшую персональную разметку. Для страниц с
+POST-формой в ETag входит и CSRF-кука: после повторного входа токен
+меняется, и закэшированная форма иначе получила бы 403.
+"""
+from hashlib import md5
+
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+
+from . import stats
+from .caching import author_generation, group_generation, index_generation
+from .models import AuthorStats, Comment, Follow, Post, User
+
+
+def _etag(request, *parts, form=False):
+    user = request.user.pk if request.user.is_authenticated else 'anon'
+    if form and request.user.is_authenticated:
+        parts += (request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),)
+    raw = ':'.join(str(part) for part in (user, *parts))
+    return md5(raw.encode()).hexdigest()
+
+
+def index_etag(request):
+    return _etag(request, index_generation())
+
+
+def group_etag(request, slug):
+    return _etag(request, group_generation(slug))
+
+
+def profile_etag(request, username):
+    # Поколение читается первым: сразу после смены оно закрепляет
+    # остальные чтения за default.
+    generation = author_generation(username)
+    fields = ('posts_count', 'followers_count', 'followings_count')
+    counters = AuthorStats.objects.filter(
+        user__username=username).values_list(*fields).first()
+    if counters is None:
+        author = User.objects.filter(username=username).first()
+        if author is None:
+            return None
+        author_stats = stats.get_stats(author)
+        counters = [getattr(author_stats, field) for field in fields]
+    following = request.user.is_authenticated and Follow.objects.filter(
+        user=request.user, author__username=username).exists()
+    return _etag(request, generation, following, *counters)
+
+
+def post_detail_etag(request, post_id):
+    # Подзапрос по индексу (post, created), а не GROUP BY по всем полям.
+    last_comment = Comment.objects.filter(
+        post=OuterRef('pk')).order_by('-created').values('pk')[:1]
+    state = Post.objects.filter(pk=post_id).annotate(
+        last_comment=Subquery(last_comment)).values_list(
+            'edited', 'comment_count', 'last_comment',
+            'author__stats__posts_count').first()
+    if state is None:
+        return None
+    # Авторизованным страница поста выводит форму комментария.
+    return _etag(request, *state, form=True)
@@ -0,0 +1,120 @@
+"""Потоковая выгрузка постов и комментариев в JSONL и CSV.
+
+Строки читаются keyset-пакетами через values_list().iterator(): в
+памяти только текущий пакет, а пакет N стоит столько же, сколько
+первый. Каждая строка несёт cursor - токен продолжения после неё, так
+что оборвавшуюся выгрузку можно продолжить с любой полученной строки.
+Поля совпадают с теми, что принимает bulk_import.
+"""
+import csv
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+
+from .models import Comment, Post
+from .paginators import CursorPaginator, decode_cursor, encode_cursor
+
+CONTENT_TYPES = {
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class Export:
+    """Выгрузка одной модели; columns - имя колонки -> путь values_list."""
+
+    def __init__(self, model, ordering, columns):
+        self.model = model
+        self.ordering = ordering
+        self.columns = columns
+        self.names = [*columns, 'cursor']
+
+    def rows(self, token=None, author=None, batch_size=None):
+        """Словари строк после курсора; ValueError - курсор битый.
+
+        Курсор проверяется сразу, а строки читаются лениво.
+        """
+        queryset = self.model.objects.all()
+        if author is not None:
+            queryset = queryset.filter(author=author)
+        paginator = CursorPaginator(queryset, None, self.ordering)
+        values = None
+        if token:
+            cursor = decode_cursor(token)
+            # Выгрузка идёт только вперёд: курсор 'p' - не её.
+            if (cursor is None or cursor[0] != 'n'
+                    or len(cursor[1]) != len(self.ordering)):
+                raise ValueError('Неверный курсор.')
+            values = cursor[1]
+            try:
+                paginator.keyset_filter(values, True)
+            except ValidationError:
+                raise ValueError('Неверный курсор.')
+        return self._rows(paginator, values,
+                          batch_size or settings.EXPORT_BATCH_SIZE)
+
+    def _rows(self, paginator, values, batch_size):
+        while True:
+            queryset = paginator.queryset
+            if values is not None:
+                queryset = queryset.filter(
+                    paginator.keyset_filter(values, True))
+            batch = queryset.order_by(*self.ordering).values_list(
+                *self.columns.values())[:batch_size]
+            count = 0
+            for row in batch.iterator():
+                record = {
+                    name: _plain(value)
+                    for name, value in zip(self.columns, row)
+                }
+                values = [record[key] for key in self.ordering]
+                record['cursor'] = encode_cursor('n', values)
+                yield record
+                count += 1
+            if count < batch_size:
+                return
+
+
+EXPORTS = {
+    'posts': Export(Post, ('pub_date', 'id'), {
+        'id': 'id',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'comment_count': 'comment_count',
+    }),
+    'comments': Export(Comment, ('id',), {
+        'id': 'id',
+        'post': 'post_id',
+        'author': 'author__username',
+        'text': 'text',
+        'created': 'created',
+    }),
+}
+
+
+class _Echo:
+    """Файл для csv.writer, который просто возвращает строку."""
+
+    def write(self, value):
+        return value
+
+
+def lines(export, fmt, rows, header=True):
+    """Строки файла выгрузки в формате fmt."""
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        if header:
+            yield writer.writerow(export.names)
+        for row in rows:
+            yield writer.writerow([row[name] for name in export.names])
+        return
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
@@ -1,15 +1,35 @@
-from django.forms import ModelForm
+from django.core.exceptions import ValidationError
+from django.forms import CharField, Form, ModelChoiceField, ModelForm
 
-from .models import Post, Comment
+from .models import Post, Comment, Group, User
+from .uploads import HeaderCheckedImageField
 
 
 class PostForm(ModelForm):
     class Meta:
         model = Post
         fields = ['group', 'text', 'image']
+        field_classes = {'image': HeaderCheckedImageField}
 
 
 class CommentForm(ModelForm):
     class Meta:
         model = Comment
         fields = ['text']
+
+
+class SearchForm(Form):
+    q = CharField(label='Что ищем', max_length=200)
+    group = ModelChoiceField(
+        Group.objects.all(), to_field_name='slug', required=False,
+        label='Группа', empty_label='Все группы')
+    author = CharField(label='Автор', max_length=150, required=False)
+
+    def clean_author(self):
+        username = self.cleaned_data['author']
+        if not username:
+            return None
+        author = User.objects.filter(username=username).first()
+        if author is None:
+            raise ValidationError('Такого автора нет.', code='unknown_author')
+        return author
@@ -0,0 +1,372 @@
+"""Потоковый импорт постов, комментариев и подписок из JSONL и CSV.
+
+Строки читаются по одной и копятся в пакеты по batch_size. Пакет
+проверяется правилами полей PostForm и CommentForm, авторы и группы
+находятся через кэш имён с одним запросом на пакет, и пакет пишется
+bulk_create в своей транзакции. Память нужна на пакет и кэш имён, а не
+на весь файл.
+
+bulk_create обходит сигналы и вьюхи, поэтому то, что они делают для
+одиночной записи (поиск, теги, счётчики, ленты, кэш), пакет делает сам.
+"""
+import csv
+import json
+from abc import ABC, abstractmethod
+from collections import Counter, defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.cache import bump_generation
+from . import autocomplete, search, stats, tags, timelines
+from .caching import INDEX_SCOPE, author_scope, group_scope
+from .forms import CommentForm, PostForm
+from .models import Comment, Follow, Group, Post, User
+
+FORMATS = ('jsonl', 'csv')
+MAX_REPORTED_ERRORS = 20
+
+
+def read_rows(stream, fmt):
+    """Пары (номер строки файла, словарь или None для битой строки)."""
+    if fmt == 'csv':
+        # Первая строка CSV - заголовок.
+        yield from enumerate(csv.DictReader(stream), start=2)
+        return
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+class Lookup:
+    """Значение ключа -> pk с одним запросом на пакет.
+
+    Кэш ограничен limit записями: переполненный просто очищается.
+    """
+
+    def __init__(self, queryset, field, limit=100000):
+        self.queryset = queryset
+        self.field = field
+        self.limit = limit
+        self.cache = {}
+
+    def resolve(self, keys):
+        missing = {key for key in keys if key and key not in self.cache}
+        if not missing:
+            return
+        if len(self.cache) + len(missing) > self.limit:
+            self.cache.clear()
+        self.cache.update(self.queryset.filter(
+            **{f'{self.field}__in': missing}).values_list(self.field, 'pk'))
+
+    def get(self, key):
+        return self.cache.get(key)
+
+
+def clean_field(form_class, name, value):
+    """Значение поля по правилам формы, без запросов в базу."""
+    return form_class.base_fields[name].clean(value)
+
+
+def parse_date(value):
+    """Дата из ISO 8601; пустое значение - None, наивная - в TIME_ZONE."""
+    if not value:
+        return None
+    try:
+        date = parse_datetime(value)
+    except (TypeError, ValueError):
+        date = None
+    if date is None:
+        raise ValidationError(f'Неверная дата: {value}.')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+def assign_pks(model, objects):
+    """Проставляет pk после bulk_create, если база их не вернула.
+
+    SQLite держит блокировку записи транзакции пакета с первого
+    INSERT, а AUTOINCREMENT выдаёт ключи по возрастанию, поэтому
+    последние len(objects) ключей таблицы - вставленные строки по
+    порядку.
+    """
+    if objects[0].pk is not None:
+        return
+    pks = model.objects.order_by('-pk').values_list(
+        'pk', flat=True)[:len(objects)]
+    for obj, pk in zip(objects, reversed(list(pks))):
+        obj.pk = pk
+
+
+def invalidate(usernames=(), slugs=()):
+    bump_generation(
+        INDEX_SCOPE,
+        *(author_scope(username) for username in usernames if username),
+        *(group_scope(slug) for slug in slugs if slug),
+    )
+
+
+class Importer(ABC):
+    model = None
+    # Поле строки -> допустимые типы значения; None допустим всегда.
+    fields = {}
+
+    def __init__(self, batch_size=1000, create_authors=False):
+        self.batch_size = batch_size
+        self.create_authors = create_authors
+        self.users = Lookup(User.objects.all(), 'username')
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+
+    def run(self, rows):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = []
+        if batch:
+            self._flush(batch)
+        self.finish()
+
+    def error(self, number, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f'строка {number}: {message}')
+
+    def check(self, row):
+        """Сообщение о поле неверного типа или None."""
+        for field, types in self.fields.items():
+            value = row.get(field)
+            if value is not None and (
+                    isinstance(value, bool) or not isinstance(value, types)):
+                return f'Поле {field}: неверный тип значения.'
+        return None
+
+    def _flush(self, batch):
+        checked = []
+        for number, row in batch:
+            message = ('не удалось разобрать строку' if row is None
+                       else self.check(row))
+            if message:
+                self.error(number, message)
+            else:
+                checked.append((number, row))
+        self.prepare([row for _, row in checked])
+        objects = []
+        for number, row in checked:
+            try:
+                objects.append(self.build(row))
+            except ValidationError as error:
+                self.error(number, ' '.join(error.messages))
+        if not objects:
+            return
+        with transaction.atomic():
+            self.model.objects.bulk_create(objects)
+            assign_pks(self.model, objects)
+            self.after_create(objects)
+        self.imported += len(objects)
+
+    def resolve_users(self, names):
+        names = {name for name in names if name}
+        self.users.resolve(names)
+        if not self.create_authors:
+            return
+        username = User._meta.get_field('username')
+        new = []
+        for name in names:
+            if self.users.get(name) is not None:
+                continue
+            try:
+                username.clean(name, None)
+            except ValidationError:
+                continue
+            user = User(username=name)
+            user.set_unusable_password()
+            new.append(user)
+        if new:
+            User.objects.bulk_create(new, ignore_conflicts=True)
+            self.users.resolve(user.username for user in new)
+            # pk пакета не возвращаются: индексы проще построить заново.
+            autocomplete.changed()
+
+    def user_id(self, name, label='Автор'):
+        user_id = self.users.get(name)
+        if user_id is None:
+            raise ValidationError(f'{label} {name!r} не найден.')
+        return user_id
+
+    def prepare(self, rows):
+        """Заполняет кэши для пакета до проверки строк."""
+
+    @abstractmethod
+    def build(self, row):
+        """Несохранённый объект модели по строке; ValidationError - отказ."""
+
+    def after_create(self, objects):
+        """Побочные эффекты пакета внутри его транзакции."""
+
+    def finish(self):
+        """Побочные эффекты, отложенные до конца импорта."""
+
+
+class PostImporter(Importer):
+    """Поля: author, text, group (slug, необязательно), pub_date."""
+    model = Post
+    fields = {'author': str, 'text': str, 'group': str, 'pub_date': str}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.groups = Lookup(Group.objects.all(), 'slug')
+        self.author_ids = set()
+
+    def prepare(self, rows):
+        self.resolve_users(row.get('author') for row in rows)
+        self.groups.resolve(row.get('group') for row in rows)
+
+    def build(self, row):
+        post = Post(
+            author_id=self.user_id(row.get('author')),
+            text=clean_field(PostForm, 'text', row.get('text')),
+        )
+        slug = row.get('group')
+        if slug:
+            post.group_id = self.groups.get(slug)
+            if post.group_id is None:
+                raise ValidationError(f'Группа {slug!r} не найдена.')
+        post.author_name, post.group_slug = row['author'], slug
+        post.imported_date = parse_date(row.get('pub_date'))
+        return post
+
+    def after_create(self, posts):
+        dated = [post for post in posts if post.imported_date]
+        for post in dated:
+            post.pub_date = post.imported_date
+        Post.objects.bulk_update(dated, ['pub_date'])
+        search.index((post.pk, post.text) for post in posts)
+        tags.sync_many((post.pk, post.text, post.pub_date) for post in posts)
+        authors = Counter(post.author_id for post in posts)
+        stats.bump_many({
+            author_id: {'posts_count': count}
+            for author_id, count in authors.items()
+        })
+        self.author_ids.update(authors)
+        invalidate({post.author_name for post in posts},
+                   {post.group_slug for post in posts})
+
+    def finish(self):
+        # Ленты подписчиков построятся заново при следующем чтении:
+        # один сброс на читателя за весь импорт, а не на каждый пакет.
+        # Посты популярных авторов подмешиваются при чтении сами.
+        authors = self.author_ids - timelines.popular_authors(self.author_ids)
+        if authors:
+            timelines.reset(Follow.objects.filter(
+                author_id__in=authors).values('user_id'))
+
+
+class CommentImporter(Importer):
+    """Поля: post (id), author, text, created."""
+    model = Comment
+    fields = {'post': (int, str), 'author': str, 'text': str, 'created': str}
+
+    def prepare(self, rows):
+        self.resolve_users(row.get('author') for row in rows)
+        ids = set()
+        for row in rows:
+            try:
+                ids.add(int(row.get('post')))
+            except (TypeError, ValueError):
+                pass
+        self.posts = {
+            pk: (username, slug)
+            for pk, username, slug in Post.objects.filter(
+                pk__in=ids).values_list('pk', 'author__username',
+                                        'group__slug')
+        }
+
+    def build(self, row):
+        try:
+            post_id = int(row.get('post'))
+        except (TypeError, ValueError):
+            post_id = None
+        if post_id not in self.posts:
+            raise ValidationError(f'Пост {row.get("post")!r} не найден.')
+        comment = Comment(
+            post_id=post_id,
+            author_id=self.user_id(row.get('author')),
+            text=clean_field(CommentForm, 'text', row.get('text')),
+        )
+        comment.imported_date = parse_date(row.get('created'))
+        return comment
+
+    def after_create(self, comments):
+        dated = [comment for comment in comments if comment.imported_date]
+        for comment in dated:
+            comment.created = comment.imported_date
+        Comment.objects.bulk_update(dated, ['created'])
+        counts = Counter(comment.post_id for comment in comments)
+        Post.objects.filter(pk__in=counts).update(
+            comment_count=F('comment_count') + Case(
+                *(When(pk=pk, then=Value(count))
+                  for pk, count in counts.items()),
+                output_field=IntegerField(),
+            ))
+        invalidate(*zip(*(self.posts[pk] for pk in counts)))
+
+
+class FollowImporter(Importer):
+    """Поля: user (подписчик), author."""
+    model = Follow
+    fields = {'user': str, 'author': str}
+
+    def prepare(self, rows):
+        self.resolve_users(
+            name for row in rows for name in (row.get('user'),
+                                              row.get('author')))
+        ids = {self.users.get(row.get(field)) for row in rows
+               for field in ('user', 'author')}
+        ids.discard(None)
+        # Уже существующие подписки тоже считаются повтором.
+        self.pairs = set(Follow.objects.filter(
+            user_id__in=ids, author_id__in=ids).values_list(
+                'user_id', 'author_id'))
+
+    def build(self, row):
+        user_id = self.user_id(row.get('user'), 'Подписчик')
+        author_id = self.user_id(row.get('author'))
+        if user_id == author_id:
+            raise ValidationError('Нельзя подписаться на себя.')
+        if (user_id, author_id) in self.pairs:
+            raise ValidationError('Подписка повторяется.')
+        self.pairs.add((user_id, author_id))
+        return Follow(user_id=user_id, author_id=author_id)
+
+    def after_create(self, follows):
+        deltas = defaultdict(Counter)
+        for follow in follows:
+            deltas[follow.user_id]['followings_count'] += 1
+            deltas[follow.author_id]['followers_count'] += 1
+        stats.bump_many(deltas)
+        timelines.reset({follow.user_id for follow in follows})
+        timelines.followers_changed({
+            user_id: counts['followers_count']
+            for user_id, counts in deltas.items()
+            if counts['followers_count']
+        })
+
+
+IMPORTERS = {
+    'posts': PostImporter,
+    'comments': CommentImporter,
+    'follows': FollowImporter,
+}
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import tags
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Заполняет хэштеги существующих постов пакетами.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько постов разбирать в одной транзакции.',
+        )
+
+    def handle(self, *args, batch_size, **options):
+        last_id = 0
+        processed = 0
+        while True:
+            batch = list(
+                Post.objects.filter(pk__gt=last_id).order_by('pk')
+                .values_list('pk', 'text', 'pub_date')[:batch_size]
+            )
+            if not batch:
+                break
+            with transaction.atomic():
+                tags.sync_many(batch)
+            processed += len(batch)
+            last_id = batch[-1][0]
+        self.stdout.write(f'Обработано постов: {processed}')
@@ -0,0 +1,88 @@
+import random
+import time
+import tracemalloc
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+
+from posts import views
+from posts.autocomplete import Autocomplete
+from posts.models import User
+
+
+class Rollback(Exception):
+    """Откатывает транзакцию бенчмарка."""
+
+
+def _percentile(samples, share):
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * share), len(samples) - 1)]
+
+
+class Command(BaseCommand):
+    help = ('Замеряет память индекса автодополнения и задержки запросов '
+            'по префиксу на N пользователях. Данные откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, nargs='+', default=[100000, 1000000],
+            help='Сколько пользователей в базе.',
+        )
+        parser.add_argument(
+            '--queries', type=int, default=10000,
+            help='Сколько запросов замерять.',
+        )
+
+    def handle(self, *args, users, queries, **options):
+        self.stdout.write(
+            f'{"пользователей":>14} {"сборка, с":>10} {"память, МБ":>11} '
+            f'{"p50, мкс":>9} {"p99, мкс":>9} {"view p99, мкс":>14}')
+        for count in users:
+            try:
+                with transaction.atomic():
+                    self._bench(count, queries)
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def _bench(self, count, queries):
+        rng = random.Random(count)
+        alphabet = 'abcdefghijklmnopqrstuvwxyz0123456789_'
+        names = {
+            ''.join(rng.choices(alphabet, k=rng.randint(5, 14)))
+            for _ in range(count)
+        }
+        User.objects.bulk_create(
+            User(username=name) for name in names)
+        cache.clear()
+        index = Autocomplete()
+        tracemalloc.start()
+        start = time.perf_counter()
+        index.suggest('a', 10)
+        build = time.perf_counter() - start
+        memory = tracemalloc.get_traced_memory()[0] / 2 ** 20
+        tracemalloc.stop()
+
+        names = list(names)
+        prefixes = [
+            rng.choice(names)[:rng.randint(1, 4)] for _ in range(queries)
+        ]
+        samples = []
+        for prefix in prefixes:
+            start = time.perf_counter()
+            index.suggest(prefix, 10)
+            samples.append((time.perf_counter() - start) * 10 ** 6)
+        factory = RequestFactory()
+        view_samples = []
+        for prefix in prefixes[:1000]:
+            request = factory.get('/autocomplete/', {'q': prefix})
+            start = time.perf_counter()
+            views.autocomplete(request)
+            view_samples.append((time.perf_counter() - start) * 10 ** 6)
+        self.stdout.write(
+            f'{len(names):>14} {build:>10.1f} {memory:>11.1f} '
+            f'{_percentile(samples, 0.5):>9.0f} '
+            f'{_percentile(samples, 0.99):>9.0f} '
+            f'{_percentile(view_samples, 0.99):>14.0f}')
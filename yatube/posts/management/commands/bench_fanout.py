@@ -0,0 +1,73 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from posts import stats, timelines
+from posts.models import AuthorStats, Follow, Post, User
+
+
+class Rollback(Exception):
+    """Откатывает транзакцию бенчмарка."""
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return (time.perf_counter() - start) * 1000, result
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает задержки раскладки при записи и слияния при '
+            'чтении для автора с N подписчиками. Данные откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--followers', type=int, nargs='+', default=[10000, 100000],
+            help='Размеры аудитории автора.',
+        )
+        parser.add_argument(
+            '--posts', type=int, default=50,
+            help='Сколько постов у автора до замера.',
+        )
+
+    def handle(self, *args, followers, posts, **options):
+        self.stdout.write(
+            f'{"подписчиков":>12} {"режим":>7} '
+            f'{"запись, мс":>11} {"чтение, мс":>11}')
+        for count in followers:
+            try:
+                with transaction.atomic():
+                    self._bench(count, posts)
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def _bench(self, count, posts):
+        author = User.objects.create(username='bench-author')
+        User.objects.bulk_create(
+            (User(username=f'bench-{number}') for number in range(count)))
+        readers = User.objects.filter(username__startswith='bench-').exclude(
+            pk=author.pk)
+        Follow.objects.bulk_create(
+            (Follow(user_id=pk, author=author)
+             for pk in readers.values_list('pk', flat=True).iterator()))
+        Post.objects.bulk_create(
+            Post(author=author, text=f'Пост {number}')
+            for number in range(posts))
+        # bulk_create мимо счётчиков: без строки статистики автор не
+        # станет популярным, и режим pull ничем не отличится от push.
+        AuthorStats.objects.create(
+            user=author, **stats.compute_many([author.pk])[author.pk])
+        reader = readers.first()
+        modes = (('push', count + 1), ('pull', count))
+        for mode, threshold in modes:
+            with override_settings(FANOUT_FOLLOWER_THRESHOLD=threshold):
+                timelines.rebuild(reader)
+                post = Post.objects.create(author=author, text='Новый')
+                write, _ = _timed(timelines.fan_out, post)
+                read, _ = _timed(
+                    lambda: list(timelines.feed(reader)[0][:10]))
+            self.stdout.write(
+                f'{count:>12} {mode:>7} {write:>11.1f} {read:>11.1f}')
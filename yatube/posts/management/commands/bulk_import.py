@@ -0,0 +1,49 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.importing import FORMATS, IMPORTERS, read_rows
+
+
+class Command(BaseCommand):
+    help = ('Потоково импортирует посты, комментарии или подписки '
+            'из JSONL или CSV пакетами bulk_create.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS))
+        parser.add_argument('path', help='Файл; "-" - стандартный ввод.')
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Формат ввода; по умолчанию - по расширению файла.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк писать в одной транзакции.',
+        )
+        parser.add_argument(
+            '--create-authors', action='store_true',
+            help='Создавать незнакомых пользователей без пароля.',
+        )
+
+    def handle(self, *args, kind, path, batch_size, create_authors,
+               **options):
+        fmt = options['format'] or (
+            'csv' if path.lower().endswith('.csv') else 'jsonl')
+        importer = IMPORTERS[kind](batch_size, create_authors)
+        started = time.monotonic()
+        try:
+            if path == '-':
+                importer.run(read_rows(sys.stdin, fmt))
+            else:
+                with open(path, encoding='utf-8', newline='') as stream:
+                    importer.run(read_rows(stream, fmt))
+        except OSError as error:
+            raise CommandError(error)
+        elapsed = max(time.monotonic() - started, 1e-6)
+        for error in importer.errors:
+            self.stderr.write(error)
+        rate = (importer.imported + importer.failed) / elapsed
+        self.stdout.write(
+            f'Импортировано: {importer.imported}, '
+            f'с ошибками: {importer.failed}, строк в секунду: {rate:.0f}')
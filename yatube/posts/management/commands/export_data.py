@@ -0,0 +1,81 @@
+from functools import partial
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.exporting import CONTENT_TYPES, EXPORTS, lines
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = ('Потоково выгружает посты или комментарии в JSONL или CSV '
+            'keyset-пакетами.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTS))
+        parser.add_argument(
+            '--output', default='-',
+            help='Файл выгрузки; "-" - стандартный вывод.',
+        )
+        parser.add_argument(
+            '--format', choices=sorted(CONTENT_TYPES), default='jsonl',
+        )
+        parser.add_argument(
+            '--author', help='Выгрузить только записи этого пользователя.',
+        )
+        parser.add_argument(
+            '--cursor', help='Продолжить после строки с этим курсором.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help='Сколько строк читать одним запросом.',
+        )
+
+    @staticmethod
+    def _author(username):
+        if username is None:
+            return None
+        try:
+            return User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise CommandError(f'Пользователь {username} не найден.')
+
+    def _open(self, output, append):
+        if output == '-':
+            return None, partial(self.stdout.write, ending='')
+        try:
+            stream = open(output, 'a' if append else 'w',
+                          encoding='utf-8', newline='')
+        except OSError as error:
+            raise CommandError(error)
+        return stream, stream.write
+
+    def handle(self, *args, kind, output, author, cursor, batch_size,
+               **options):
+        export = EXPORTS[kind]
+        try:
+            rows = export.rows(cursor, self._author(author), batch_size)
+        except ValueError as error:
+            raise CommandError(error)
+        written, last = 0, cursor
+
+        def tracked():
+            nonlocal written, last
+            for row in rows:
+                yield row
+                written += 1
+                last = row['cursor']
+
+        stream, write = self._open(output, append=bool(cursor))
+        try:
+            for line in lines(export, options['format'], tracked(),
+                              header=not cursor):
+                write(line)
+        except KeyboardInterrupt:
+            raise CommandError(
+                f'Прервано после {written} строк, продолжить: '
+                f'--cursor {last}')
+        finally:
+            if stream is not None:
+                stream.close()
+        # stdout может быть самой выгрузкой, поэтому итог - в stderr.
+        self.stderr.write(f'Выгружено строк: {written}, курсор: {last}')
@@ -0,0 +1,51 @@
+import os
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from sorl.thumbnail import delete as delete_thumbnails
+from sorl.thumbnail.images import ImageFile
+
+from posts.models import MediaBlob, Post
+from posts.thumbnails import image_storage
+
+
+class Command(BaseCommand):
+    help = ('Удаляет файлы картинок, на которые не ссылается ни один пост, '
+            'вместе с их миниатюрами и адаптивными вариантами.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=60,
+            help='Сколько минут файл без ссылок не трогается: '
+                 'его может подхватывать загрузка, которая ещё идёт.',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что будет удалено.',
+        )
+
+    def handle(self, *args, grace, dry_run, **options):
+        cutoff = timezone.now() - timedelta(minutes=grace)
+        blobs = MediaBlob.objects.filter(refcount=0, updated__lt=cutoff)
+        removed = 0
+        for blob in blobs.iterator():
+            # Счётчик мог разойтись с базой: проверяем ссылки напрямую.
+            if Post.objects.filter(image=blob.name).exists():
+                continue
+            self.stdout.write(blob.name)
+            if not dry_run:
+                self._remove(blob)
+            removed += 1
+        self.stdout.write(f'Удалено файлов: {removed}')
+
+    def _remove(self, blob):
+        delete_thumbnails(ImageFile(blob.name, image_storage))
+        directory, filename = os.path.split(blob.name)
+        prefix = os.path.splitext(filename)[0] + '_'
+        if default_storage.exists(directory):
+            for variant in default_storage.listdir(directory)[1]:
+                if variant.startswith(prefix):
+                    default_storage.delete(os.path.join(directory, variant))
+        blob.delete()
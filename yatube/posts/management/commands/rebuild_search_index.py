@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts import search
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Заново индексирует тексты всех постов для поиска FTS5. '
+            'Индекс не очищается, поиск работает всё время пересборки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько постов индексировать в одной транзакции.',
+        )
+
+    def handle(self, *args, batch_size, **options):
+        if not search.available():
+            raise CommandError('Поисковый индекс FTS5 есть только на SQLite.')
+        last_id = 0
+        indexed = 0
+        while True:
+            batch = list(
+                Post.objects.filter(pk__gt=last_id).order_by('pk')
+                .values_list('pk', 'text')[:batch_size]
+            )
+            if not batch:
+                break
+            with transaction.atomic():
+                search.index(batch)
+            indexed += len(batch)
+            last_id = batch[-1][0]
+        pruned = search.prune()
+        search.optimize()
+        self.stdout.write(f'Проиндексировано постов: {indexed}, '
+                          f'удалено лишних: {pruned}')
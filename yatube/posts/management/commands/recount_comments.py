@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, Value, When
+
+from posts.models import Comment, Post
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает Post.comment_count пакетными UPDATE.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько постов проверять за один проход.',
+        )
+
+    def handle(self, *args, batch_size, **options):
+        last_id = 0
+        fixed = 0
+        while True:
+            batch = dict(
+                Post.objects.filter(pk__gt=last_id).order_by('pk')
+                .values_list('pk', 'comment_count')[:batch_size]
+            )
+            if not batch:
+                break
+            real = dict(
+                Comment.objects.filter(post_id__in=batch).order_by()
+                .values_list('post').annotate(Count('pk'))
+            )
+            drift = {
+                pk: real.get(pk, 0) for pk, count in batch.items()
+                if real.get(pk, 0) != count
+            }
+            if drift:
+                with transaction.atomic():
+                    fixed += Post.objects.filter(pk__in=drift).update(
+                        comment_count=Case(
+                            *(When(pk=pk, then=Value(count))
+                              for pk, count in drift.items()),
+                            output_field=IntegerField(),
+                        )
+                    )
+            last_id = max(batch)
+        self.stdout.write(f'Исправлено счётчиков: {fixed}')
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import stats
+from posts.models import AuthorStats, User
+
+FIELDS = ('posts_count', 'followers_count', 'followings_count')
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает статистику авторов (AuthorStats) пакетами.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько пользователей проверять за один проход.',
+        )
+
+    def handle(self, *args, batch_size, **options):
+        last_id = 0
+        fixed = 0
+        while True:
+            ids = list(
+                User.objects.filter(pk__gt=last_id).order_by('pk')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            counts = stats.compute_many(ids)
+            current = AuthorStats.objects.in_bulk(ids)
+            missing, changed = [], []
+            for pk in ids:
+                real = AuthorStats(user_id=pk, **counts[pk])
+                stored = current.get(pk)
+                if stored is None:
+                    missing.append(real)
+                elif any(getattr(stored, field) != getattr(real, field)
+                         for field in FIELDS):
+                    changed.append(real)
+            with transaction.atomic():
+                AuthorStats.objects.bulk_create(missing)
+                AuthorStats.objects.bulk_update(changed, FIELDS)
+            fixed += len(missing) + len(changed)
+            last_id = ids[-1]
+        self.stdout.write(f'Исправлено записей статистики: {fixed}')
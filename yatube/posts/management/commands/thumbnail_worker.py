@@ -0,0 +1,94 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.workers import setup as setup_worker
+from posts import thumbnails
+from posts.models import Post
+
+# Настройки, которые процессы пула берут у родителя, даже если они
+# переопределены после запуска (override_settings в тестах).
+WORKER_SETTINGS = (
+    'MEDIA_ROOT', 'POST_IMAGE_NORMALIZED_SIDE', 'IMAGE_VARIANT_WIDTHS',
+)
+
+
+def _generate(name):
+    """Задача пула: (имя, текст ошибки или None, результат generate)."""
+    try:
+        result = thumbnails.generate(name)
+    except Exception as error:
+        return name, f'{type(error).__name__}: {error}', ()
+    return name, None, result
+
+
+class Command(BaseCommand):
+    help = ('Нарезает миниатюры картинок из очереди ThumbnailJob '
+            'в пуле процессов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Размер пула; 0 - нарезать в текущем процессе.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=50,
+            help='Сколько задач забирать из очереди за раз.',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=2.0,
+            help='Пауза между опросами пустой очереди, секунд.',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Разобрать очередь и выйти.',
+        )
+        parser.add_argument(
+            '--backfill', action='store_true',
+            help='Сначала поставить в очередь картинки всех постов.',
+        )
+
+    def handle(self, *args, workers, batch_size, interval, once, backfill,
+               **options):
+        if backfill:
+            names = Post.objects.exclude(image='').values_list(
+                'image', flat=True).distinct()
+            thumbnails.enqueue(*names.iterator())
+        pool = None
+        if workers:
+            # spawn, а не fork: дочерние процессы не наследуют соединения
+            # с базой. В базу они и не ходят: kvstore sorl у них в памяти,
+            # а записи сохраняет родитель.
+            overrides = {name: getattr(settings, name)
+                         for name in WORKER_SETTINGS}
+            overrides['THUMBNAIL_KVSTORE'] = 'posts.thumbnails.WorkerKVStore'
+            pool = ProcessPoolExecutor(
+                workers, mp_context=multiprocessing.get_context('spawn'),
+                initializer=setup_worker, initargs=(overrides,))
+        done = failed = 0
+        try:
+            while True:
+                jobs = {job.image: job for job in
+                        thumbnails.pending()[:batch_size]}
+                if not jobs:
+                    if once:
+                        break
+                    time.sleep(interval)
+                    continue
+                results = (pool.map(_generate, jobs) if pool
+                           else map(_generate, jobs))
+                for name, error, result in results:
+                    thumbnails.finish(jobs[name], error, *result)
+                    if error is None:
+                        done += 1
+                    else:
+                        failed += 1
+                        self.stderr.write(f'{name}: {error}')
+        finally:
+            if pool:
+                pool.shutdown()
+        self.stdout.write(f'Готово: {done}, с ошибкой: {failed}')
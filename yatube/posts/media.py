@@ -0,0 +1,42 @@
+"""Учёт ссылок постов на файлы картинок (MediaBlob).
+
+Хранилище картинок адресуется содержимым, поэтому один файл может
+принадлежать многим постам. Счётчик ссылок меняется сигналами Post и
+воркером миниатюр; файлы без ссылок удаляет команда gc_media.
+"""
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import MediaBlob
+
+
+def retain(name, count=1):
+    """Добавляет count ссылок на файл name."""
+    if not name or not count:
+        return
+    # update() обходит auto_now: отметку времени, по которой gc_media
+    # отсчитывает --grace, ставим явно.
+    if not MediaBlob.objects.filter(name=name).update(
+            refcount=F('refcount') + count, updated=timezone.now()):
+        blob, created = MediaBlob.objects.get_or_create(
+            name=name, defaults={'refcount': count})
+        if not created:
+            MediaBlob.objects.filter(pk=blob.pk).update(
+                refcount=F('refcount') + count, updated=timezone.now())
+
+
+def release(name, count=1):
+    """Снимает count ссылок с файла name."""
+    if not name or not count:
+        return
+    MediaBlob.objects.filter(name=name).update(
+        refcount=Greatest(F('refcount') - count, 0),
+        updated=timezone.now())
+
+
+def move(old_name, new_name, count):
+    """Переносит count ссылок с old_name на new_name."""
+    if old_name != new_name:
+        release(old_name, count)
+        retain(new_name, count)
@@ -0,0 +1,42 @@
+# Generated by Django 2.2.16 on 2026-10-18 21:30
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def mark_built(apps, schema_editor):
+    """Непустые ленты уже построены: им не нужна перестройка."""
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    TimelineBuilt = apps.get_model('posts', 'TimelineBuilt')
+    TimelineBuilt.objects.bulk_create(
+        TimelineBuilt(user_id=user_id)
+        for user_id in TimelineEntry.objects.values_list(
+            'user_id', flat=True).distinct().iterator())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0022_posttag_pub_date_id_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineBuilt',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='timeline_built', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Читатель')),
+                ('built', models.DateTimeField(auto_now=True, verbose_name='Дата построения')),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='timelineentry',
+            name='timeline_user_pub_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date', '-post'], name='timeline_user_date_post_idx'),
+        ),
+        migrations.RunPython(mark_built, migrations.RunPython.noop),
+    ]
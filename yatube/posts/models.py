@@ -2,6 +2,8 @@ from django.db import models
 from django.conf import settings
 from django.contrib.auth import get_user_model
 
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -24,9 +26,15 @@ class Post(models.Model):
         verbose_name='Дата публикации',
         help_text='Дата публикации поста',
     )
+    edited = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+        help_text='Дата последнего изменения поста',
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
+        db_index=False,
         related_name='posts',
         verbose_name='Автор',
         help_text='Автор поста',
@@ -36,6 +44,7 @@ class Post(models.Model):
         on_delete=models.SET_NULL,
         blank=True,
         null=True,
+        db_index=False,
         related_name='posts',
         verbose_name='Группа',
         help_text='Группа, к которой будет относиться пост',
@@ -43,10 +52,34 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
+        blank=True,
+    )
+    image_variants = models.TextField(
         blank=True,
+        editable=False,
+        verbose_name='варианты картинки',
+        help_text='JSON: имя, ширина, высота и тип каждого варианта',
+    )
+    comment_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='количество комментариев',
+        help_text='Поддерживается при добавлении и удалении комментариев',
     )
 
     class Meta:
+        # Индексы повторяют ленты: фильтр, затем порядок -pub_date, -id
+        # (id SQLite дописывает в индекс сам). Отдельные индексы author и
+        # group не нужны: это первые столбцы составных.
+        indexes = [
+            models.Index(fields=['pub_date', 'id'],
+                         name='post_pub_date_id_idx'),
+            models.Index(fields=['group', 'pub_date'],
+                         name='post_group_pub_date_idx'),
+            models.Index(fields=['author', 'pub_date'],
+                         name='post_author_pub_date_idx'),
+        ]
         ordering = ('-pub_date',)
 
     def __str__(self):
@@ -59,6 +92,7 @@ class Comment(models.Model):
         on_delete=models.SET_NULL,
         blank=True,
         null=True,
+        db_index=False,
         related_name='comments',
         verbose_name='пост',
         help_text='Пост, к которому будет относиться комментарий',
@@ -81,6 +115,10 @@ class Comment(models.Model):
     )
 
     class Meta:
+        indexes = [
+            models.Index(fields=['post', 'created'],
+                         name='comment_post_created_idx'),
+        ]
         ordering = ('-created',)
 
     def __str__(self):
@@ -116,3 +154,175 @@ class Follow(models.Model):
 
     def __str__(self):
         return f'Подписчик {self.user}, Автор {self.author}'
+
+
+class AuthorStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='постов',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='подписчиков',
+        help_text='Сколько пользователей подписано на автора',
+    )
+    followings_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='подписок',
+        help_text='На скольких авторов подписан пользователь',
+    )
+
+    def __str__(self):
+        return f'Статистика {self.user}'
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель',
+        help_text='Чья это лента подписок',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='пост',
+        help_text='Пост автора, на которого подписан читатель',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации',
+        help_text='Копия даты публикации поста для индекса ленты',
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_timeline_entry'),
+        ]
+        indexes = [
+            # Весь ключ TIMELINE_ORDERING: лента читается без сортировки.
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_date_post_idx'),
+        ]
+        ordering = ('-pub_date',)
+
+
+class TimelineBuilt(models.Model):
+    """Метка материализованной ленты: пустая лента тоже построена."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='timeline_built',
+        verbose_name='Читатель',
+    )
+    built = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата построения',
+    )
+
+    def __str__(self):
+        return f'Лента {self.user}'
+
+    def __str__(self):
+        return f'Лента {self.user}, пост {self.post_id}'
+
+
+class ThumbnailJob(models.Model):
+    image = models.CharField(
+        max_length=255,
+        unique=True,
+        verbose_name='Картинка',
+        help_text='Имя файла в хранилище, для которого нужны миниатюры',
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата постановки',
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='попыток',
+    )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name='Последняя ошибка',
+    )
+
+    class Meta:
+        ordering = ('id',)
+
+    def __str__(self):
+        return f'Миниатюры {self.image}'
+
+
+class MediaBlob(models.Model):
+    name = models.CharField(
+        max_length=255,
+        unique=True,
+        verbose_name='Файл',
+        help_text='Имя файла картинки в хранилище',
+    )
+    refcount = models.PositiveIntegerField(
+        default=0,
+        verbose_name='ссылок',
+        help_text='Сколько постов используют файл',
+    )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
+
+    def __str__(self):
+        return f'{self.name} ({self.refcount})'
+
+
+class Tag(models.Model):
+    name = models.CharField(
+        max_length=100,
+        unique=True,
+        verbose_name='тег',
+        help_text='Тег из текста поста без # в нижнем регистре',
+    )
+
+    def __str__(self):
+        return f'#{self.name}'
+
+
+class PostTag(models.Model):
+    tag = models.ForeignKey(
+        Tag,
+        on_delete=models.CASCADE,
+        related_name='post_tags',
+        verbose_name='тег',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='post_tags',
+        verbose_name='пост',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации',
+        help_text='Копия даты публикации поста для индекса ленты тега',
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tag', 'post'],
+                                    name='unique_post_tag'),
+        ]
+        indexes = [
+            # Весь ключ TAG_ORDERING: курсор идёт по индексу без сортировки.
+            models.Index(fields=['tag', '-pub_date', '-id'],
+                         name='post_tag_tag_pub_date_id_idx'),
+        ]
+        ordering = ('-pub_date', '-id')
@@ -0,0 +1,178 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, Paginator
+from django.db.models import Max, Q
+from django.utils.functional import cached_property
+
+POST_ORDERING = ('-pub_date', '-id')
+FOLLOW_ORDERING = ('-id',)
+
+
+def encode_cursor(direction, values):
+    """Упаковывает направление и значения ключа в непрозрачный токен."""
+    raw = json.dumps([direction, values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковывает токен; для битого токена возвращает None."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direction, values = json.loads(raw.decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        return None
+    if direction not in ('n', 'p') or not isinstance(values, list):
+        return None
+    return direction, values
+
+
+class CursorPage:
+    """Страница курсорной пагинации, совместимая с шаблонами ленты."""
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, next_cursor=None,
+                 previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self.object_list)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Keyset-пагинация по упорядоченному уникальному ключу.
+
+    Вместо OFFSET и COUNT(*) страница выбирается условием
+    «строго после/до ключа крайнего объекта», поэтому страница N
+    стоит столько же, сколько первая.
+    """
+
+    def __init__(self, queryset, per_page, ordering=POST_ORDERING):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.fields = [
+            queryset.model._meta.get_field(key.lstrip('-'))
+            for key in self.ordering
+        ]
+
+    def _values(self, obj):
+        return [field.value_to_string(obj) for field in self.fields]
+
+    def keyset_filter(self, values, forward):
+        """Условие (k1, k2, ...) > или < (v1, v2, ...) с учётом знаков.
+
+        ValidationError - значение курсора не подходит полю ключа.
+        """
+        condition = Q()
+        equal = Q()
+        for key, field, value in zip(self.ordering, self.fields, values):
+            descending = key.startswith('-')
+            lookup = 'lt' if descending == forward else 'gt'
+            # Курсор приходит от клиента: в JSON может быть что угодно.
+            if isinstance(value, bool) or not isinstance(
+                    value, (str, int, float)):
+                raise ValidationError('Неверное значение курсора.')
+            try:
+                value = field.to_python(value)
+            except (TypeError, ValueError):
+                raise ValidationError('Неверное значение курсора.')
+            condition |= equal & Q(**{f'{field.name}__{lookup}': value})
+            equal &= Q(**{field.name: value})
+        return condition
+
+    def _reversed_ordering(self):
+        return tuple(key[1:] if key.startswith('-') else f'-{key}'
+                     for key in self.ordering)
+
+    def page(self, token):
+        cursor = decode_cursor(token)
+        if cursor is not None and len(cursor[1]) != len(self.fields):
+            cursor = None
+        queryset = self.queryset
+        forward = cursor is None or cursor[0] == 'n'
+        if cursor is not None:
+            try:
+                queryset = queryset.filter(
+                    self.keyset_filter(cursor[1], forward))
+            except ValidationError:
+                return self.page(None)
+        ordering = self.ordering if forward else self._reversed_ordering()
+        objects = list(queryset.order_by(*ordering)[:self.per_page + 1])
+        has_more = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+        if not forward:
+            objects.reverse()
+        next_cursor = previous_cursor = None
+        if objects:
+            if (forward and has_more) or not forward:
+                next_cursor = encode_cursor('n', self._values(objects[-1]))
+            if (not forward and has_more) or (forward and cursor):
+                previous_cursor = encode_cursor(
+                    'p', self._values(objects[0]))
+        return CursorPage(objects, self, next_cursor, previous_cursor)
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор без точного COUNT(*) по большой выборке.
+
+    Строки считаются не дальше settings.ADMIN_EXACT_COUNT_LIMIT. Если
+    их больше, count - оценка: для всей таблицы наибольший pk, для
+    отфильтрованной - сам предел. Страницы за оценкой тоже открываются,
+    просто оказываются короче или пустыми.
+    """
+    estimated = False
+
+    @cached_property
+    def count(self):
+        limit = settings.ADMIN_EXACT_COUNT_LIMIT
+        queryset = self.object_list.order_by()
+        count = queryset.values('pk')[:limit + 1].count()
+        if count <= limit:
+            return count
+        self.estimated = True
+        if not queryset.query.where:
+            return max(queryset.aggregate(last=Max('pk'))['last'], limit)
+        return limit
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            if self.estimated and int(number) > 1:
+                return int(number)
+            raise
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.estimated:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(
+            self.object_list[bottom:bottom + self.per_page], number, self)
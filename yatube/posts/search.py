@@ -0,0 +1,186 @@
+"""Полнотекстовый поиск по постам на SQLite FTS5.
+
+Текст постов дублируется в виртуальную таблицу posts_post_fts
+(rowid - id поста). Её держат в актуальном состоянии сигналы Post, а
+целиком пересобирает команда rebuild_search_index. Результаты
+упорядочены по bm25 и листаются курсором (rank, id), как ленты.
+Строки удалённых в обход сигналов постов отсекает соединение с
+posts_post. На других СУБД таблицы нет, и поиск сводится к icontains.
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+from .paginators import (
+    POST_ORDERING, CursorPage, CursorPaginator, decode_cursor, encode_cursor,
+)
+
+TABLE = 'posts_post_fts'
+TERM_RE = re.compile(r'\w+')
+MAX_TERMS = 10
+# remove_diacritics в unicode61 работает только для латиницы.
+YO = str.maketrans('ёЁ', 'еЕ')
+
+
+def available():
+    return connection.vendor == 'sqlite'
+
+
+def terms(query):
+    """Слова запроса без операторов FTS5."""
+    return TERM_RE.findall((query or '').translate(YO))[:MAX_TERMS]
+
+
+def match_expression(words):
+    """Все слова обязательны, последнее - как префикс."""
+    quoted = [f'"{word}"' for word in words]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def index(rows):
+    """Добавляет или заменяет в индексе пары (id поста, текст)."""
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT OR REPLACE INTO {TABLE} (rowid, text) VALUES (%s, %s)',
+            [(post_id, text.translate(YO)) for post_id, text in rows])
+
+
+def remove(post_ids):
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {TABLE} WHERE rowid = %s',
+                           [(post_id,) for post_id in post_ids])
+
+
+def prune():
+    """Удаляет из индекса посты, которых уже нет."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid NOT IN '
+                       f'(SELECT id FROM posts_post)')
+        return cursor.rowcount
+
+
+def optimize():
+    """Сливает сегменты индекса в один."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+
+
+class SearchPaginator:
+    """Курсорная пагинация результатов FTS5 по ключу (bm25, id).
+
+    bm25 отрицателен, и чем он меньше, тем выше совпадение. Ранг
+    зависит от статистики всего индекса, поэтому при правках постов
+    между страницами результат может сдвинуться на пару позиций.
+    """
+
+    def __init__(self, words, per_page, group=None, author=None):
+        self.match = match_expression(words)
+        self.per_page = per_page
+        self.filters = []
+        self.params = []
+        if group is not None:
+            self.filters.append('p.group_id = %s')
+            self.params.append(group.pk)
+        if author is not None:
+            self.filters.append('p.author_id = %s')
+            self.params.append(author.pk)
+
+    def _rows(self, values, forward):
+        where = [f'{TABLE} MATCH %s', *self.filters]
+        params = [self.match, *self.params]
+        if values is not None:
+            sign = '>' if forward else '<'
+            where.append(f'(bm25({TABLE}) {sign} %s OR '
+                         f'(bm25({TABLE}) = %s AND p.id {sign} %s))')
+            params += [values[0], values[0], values[1]]
+        direction = 'ASC' if forward else 'DESC'
+        sql = (
+            f'SELECT p.id, bm25({TABLE}) AS rank FROM {TABLE} '
+            f'JOIN posts_post p ON p.id = {TABLE}.rowid '
+            f'WHERE {" AND ".join(where)} '
+            f'ORDER BY rank {direction}, p.id {direction} LIMIT %s'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params + [self.per_page + 1])
+            return cursor.fetchall()
+
+    @staticmethod
+    def _key(row):
+        post_id, rank = row
+        return [rank, post_id]
+
+    @staticmethod
+    def _values(cursor):
+        if cursor is None:
+            return None
+        try:
+            rank, post_id = cursor[1]
+            return float(rank), int(post_id)
+        except (TypeError, ValueError):
+            return None
+
+    def page(self, token):
+        cursor = decode_cursor(token)
+        values = self._values(cursor)
+        forward = values is None or cursor[0] == 'n'
+        rows = self._rows(values, forward)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+        posts = Post.objects.select_related('author', 'group').in_bulk(
+            [post_id for post_id, _ in rows])
+        objects = [posts[post_id] for post_id, _ in rows if post_id in posts]
+        next_cursor = previous_cursor = None
+        if rows:
+            if has_more or not forward:
+                next_cursor = encode_cursor('n', self._key(rows[-1]))
+            if (has_more and not forward) or (forward and values):
+                previous_cursor = encode_cursor('p', self._key(rows[0]))
+        return CursorPage(objects, self, next_cursor, previous_cursor)
+
+
+def _icontains(words):
+    condition = Q()
+    for word in words:
+        condition &= Q(text__icontains=word)
+    return condition
+
+
+def filter_posts(queryset, query):
+    """Сужает queryset постов до совпавших с запросом, без ранжирования."""
+    words = terms(query)
+    if not words:
+        return queryset
+    if not available():
+        return queryset.filter(_icontains(words))
+    # RawSQL в pk__in обернулся бы в скалярный подзапрос (( ... )) и
+    # дал бы только первый rowid, поэтому IN - целиком в выражении.
+    matched = RawSQL(
+        f'posts_post.id IN (SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s)',
+        (match_expression(words),), output_field=BooleanField())
+    return queryset.annotate(search_match=matched).filter(search_match=True)
+
+
+def search(query, token, per_page, group=None, author=None):
+    """Страница результатов поиска; пустая, если в запросе нет слов."""
+    words = terms(query)
+    if not words:
+        return CursorPage([], None)
+    if available():
+        return SearchPaginator(words, per_page, group, author).page(token)
+    condition = _icontains(words)
+    if group is not None:
+        condition &= Q(group=group)
+    if author is not None:
+        condition &= Q(author=author)
+    posts = Post.objects.select_related('author', 'group').filter(condition)
+    return CursorPaginator(posts, per_page, POST_ORDERING).page(token)
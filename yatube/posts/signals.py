@@ -0,0 +1,168 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.cache import bump_generation
+
+from . import autocomplete, media, search
+from .caching import INDEX_SCOPE, author_scope, group_scope, invalidate_feeds
+from .models import Comment, Group, Post, User
+
+
+def _username(user_id):
+    return User.objects.filter(pk=user_id).values_list(
+        'username', flat=True).first()
+
+
+def _slug(group_id):
+    if group_id is None:
+        return None
+    return Group.objects.filter(pk=group_id).values_list(
+        'slug', flat=True).first()
+
+
+def _card_fields(model, pk, fields):
+    if pk is None:
+        return None
+    return model.objects.filter(pk=pk).values_list(*fields).first()
+
+
+def _refresh_cards(posts):
+    """Сдвигает edited постов: ключи их карточек и ETag меняются.
+
+    Сбрасываются фрагменты всех лент, где эти карточки выводятся.
+    """
+    scopes = {INDEX_SCOPE}
+    for username, slug in posts.values_list(
+            'author__username', 'group__slug').distinct():
+        scopes.add(author_scope(username))
+        if slug:
+            scopes.add(group_scope(slug))
+    posts.update(edited=timezone.now())
+    bump_generation(*scopes)
+
+
+@receiver(pre_save, sender=Post)
+def remember_old_state(sender, instance, **kwargs):
+    """Запоминает прежние группу и картинку.
+
+    Пост пропадает и из ленты прежней группы, а ссылка на прежний файл
+    картинки снимается.
+    """
+    instance._old_group_id = instance._old_image = None
+    if instance.pk is not None:
+        instance._old_group_id, instance._old_image = Post.objects.filter(
+            pk=instance.pk).values_list('group_id', 'image').first() or (
+                None, None)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_feeds(sender, instance, **kwargs):
+    group_ids = {instance.group_id, getattr(instance, '_old_group_id', None)}
+    invalidate_feeds(_username(instance.author_id),
+                     *(_slug(group_id) for group_id in group_ids))
+
+
+@receiver(post_save, sender=Post)
+def count_image_references(sender, instance, **kwargs):
+    old, new = instance._old_image or '', instance.image.name or ''
+    if old != new:
+        media.release(old)
+        media.retain(new)
+
+
+@receiver(post_delete, sender=Post)
+def release_image(sender, instance, **kwargs):
+    media.release(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'text' in update_fields:
+        search.index([(instance.pk, instance.text)])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.remove([instance.pk])
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_feeds(sender, instance, **kwargs):
+    """Комментарий меняет счётчик в карточке поста во всех лентах."""
+    post = Post.objects.filter(pk=instance.post_id).values_list(
+        'author__username', 'group__slug').first()
+    if post is not None:
+        invalidate_feeds(*post)
+
+
+GROUP_CARD_FIELDS = ('title', 'slug')
+USER_CARD_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(pre_save, sender=Group)
+def remember_old_group(sender, instance, **kwargs):
+    instance._old_card_fields = _card_fields(
+        Group, instance.pk, GROUP_CARD_FIELDS)
+
+
+@receiver(post_save, sender=Group)
+def invalidate_group_feeds(sender, instance, **kwargs):
+    """Название и slug группы выводятся в карточках постов."""
+    invalidate_feeds(None, instance.slug)
+    old = getattr(instance, '_old_card_fields', None)
+    if old is not None and old != tuple(
+            getattr(instance, field) for field in GROUP_CARD_FIELDS):
+        _refresh_cards(Post.objects.filter(group=instance))
+
+
+@receiver(pre_save, sender=User)
+def remember_old_user(sender, instance, update_fields=None, **kwargs):
+    instance._old_card_fields = None
+    if update_fields is None or set(update_fields) & set(USER_CARD_FIELDS):
+        instance._old_card_fields = _card_fields(
+            User, instance.pk, USER_CARD_FIELDS)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_cards(sender, instance, **kwargs):
+    """Имя и ссылка на профиль автора выводятся в карточках постов."""
+    old = getattr(instance, '_old_card_fields', None)
+    if old is not None and old != tuple(
+            getattr(instance, field) for field in USER_CARD_FIELDS):
+        _refresh_cards(Post.objects.filter(author=instance))
+
+
+@receiver(pre_save, sender=User)
+def remember_old_username(sender, instance, update_fields=None, **kwargs):
+    instance._old_username = None
+    if instance.pk is not None and (
+            update_fields is None or 'username' in update_fields):
+        instance._old_username = User.objects.filter(
+            pk=instance.pk).values_list('username', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def update_user_autocomplete(sender, instance, created, **kwargs):
+    """Вход пользователя и смена пароля индекс не трогают."""
+    if created:
+        autocomplete.added(instance)
+    elif getattr(instance, '_old_username', None) not in (
+            None, instance.username):
+        autocomplete.changed()
+
+
+@receiver(post_save, sender=Group)
+def update_group_autocomplete(sender, instance, created, **kwargs):
+    if created:
+        autocomplete.added(instance)
+    else:
+        autocomplete.changed()
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Group)
+def forget_autocomplete(sender, instance, **kwargs):
+    autocomplete.changed()
@@ -0,0 +1,98 @@
+"""Поддерживаемая статистика автора: посты, подписчики, подписки.
+
+Счётчики меняются F()-выражениями в тех же местах posts.views, где
+создаются и удаляются посты и подписки. Строка статистики создаётся
+лениво: при первом обращении счётчики считаются по default, даже если
+вьюха читает с реплики. Расхождения чинит команда repair_user_stats.
+"""
+from collections import defaultdict
+
+from django.db.models import Case, Count, F, IntegerField, Value, When
+from django.db.models.functions import Greatest
+
+from core.replicas import primary_reads
+
+from .models import AuthorStats, Follow, Post
+
+
+def compute(user_id):
+    """Честно считает счётчики пользователя по базе."""
+    return {
+        'posts_count': Post.objects.filter(author_id=user_id).count(),
+        'followers_count': Follow.objects.filter(author_id=user_id).count(),
+        'followings_count': Follow.objects.filter(user_id=user_id).count(),
+    }
+
+
+def _counts(queryset, field, ids):
+    return dict(
+        queryset.filter(**{f'{field}__in': ids}).order_by()
+        .values_list(field).annotate(Count('pk'))
+    )
+
+
+def compute_many(user_ids):
+    """compute() для многих пользователей тремя запросами."""
+    posts = _counts(Post.objects, 'author_id', user_ids)
+    followers = _counts(Follow.objects, 'author_id', user_ids)
+    followings = _counts(Follow.objects, 'user_id', user_ids)
+    return {
+        pk: {
+            'posts_count': posts.get(pk, 0),
+            'followers_count': followers.get(pk, 0),
+            'followings_count': followings.get(pk, 0),
+        }
+        for pk in user_ids
+    }
+
+
+def get_stats(user):
+    """Все счётчики пользователя одним запросом."""
+    try:
+        return AuthorStats.objects.get(user_id=user.pk)
+    except AuthorStats.DoesNotExist:
+        with primary_reads(sticky=False):
+            stats, _ = AuthorStats.objects.get_or_create(
+                user_id=user.pk, defaults=compute(user.pk))
+        return stats
+
+
+def bump(user_id, **deltas):
+    """Сдвигает счётчики; отсутствующая строка создаётся по базе."""
+    changes = {
+        field: Greatest(F(field) + delta, 0)
+        for field, delta in deltas.items()
+    }
+    if not AuthorStats.objects.filter(user_id=user_id).update(**changes):
+        with primary_reads():
+            AuthorStats.objects.get_or_create(
+                user_id=user_id, defaults=compute(user_id))
+
+
+def bump_many(deltas):
+    """bump() для пакета: deltas - {user_id: {поле: сдвиг}}.
+
+    Существующие строки сдвигаются одним UPDATE, недостающие создаются
+    по базе, как в bump(). Пользователь должен встречаться в deltas
+    один раз: созданная по базе строка уже учитывает все его сдвиги.
+    """
+    existing = set(AuthorStats.objects.filter(
+        user_id__in=deltas).values_list('user_id', flat=True))
+    by_field = defaultdict(lambda: defaultdict(list))
+    for user_id in existing:
+        for field, delta in deltas[user_id].items():
+            by_field[field][delta].append(user_id)
+    if by_field:
+        AuthorStats.objects.filter(user_id__in=existing).update(**{
+            field: Greatest(F(field) + Case(
+                *(When(user_id__in=ids, then=Value(delta))
+                  for delta, ids in groups.items()),
+                default=Value(0), output_field=IntegerField(),
+            ), 0)
+            for field, groups in by_field.items()
+        })
+    missing = [user_id for user_id in deltas if user_id not in existing]
+    AuthorStats.objects.bulk_create(
+        (AuthorStats(user_id=user_id, **counts)
+         for user_id, counts in compute_many(missing).items()),
+        ignore_conflicts=True)
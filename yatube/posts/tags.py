@@ -0,0 +1,59 @@
+"""Хэштеги постов: разбор текста и обратный индекс PostTag.
+
+Теги выделяются из текста при создании и правке поста, и каждая пара
+(тег, пост) хранится в PostTag с копией даты публикации. Лента тега
+читает индекс (tag, -pub_date) диапазоном, не трогая тексты постов.
+"""
+import re
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+
+from .models import PostTag, Tag
+
+TAG_RE = re.compile(r'(?<![\w#&])#(\w+)')
+TAG_ORDERING = ('-pub_date', '-id')
+MAX_LENGTH = Tag._meta.get_field('name').max_length
+
+
+def normalize(name):
+    return name.casefold()
+
+
+def extract(text):
+    """Нормализованные теги из текста; одни цифры тегом не считаются."""
+    return {
+        normalize(name) for name in TAG_RE.findall(text or '')
+        if len(name) <= MAX_LENGTH and not name.isdigit()
+    }
+
+
+def sync_many(rows):
+    """Приводит PostTag к текстам постов; rows - (pk, text, pub_date)."""
+    wanted = {pk: (extract(text), pub_date) for pk, text, pub_date in rows}
+    names = set().union(*(names for names, _ in wanted.values()))
+    Tag.objects.bulk_create(
+        (Tag(name=name) for name in names), ignore_conflicts=True)
+    tag_ids = dict(Tag.objects.filter(name__in=names).values_list(
+        'name', 'pk'))
+    links = {
+        (tag_ids[name], pk): pub_date
+        for pk, (names, pub_date) in wanted.items() for name in names
+    }
+    existing = set(PostTag.objects.filter(post_id__in=wanted).values_list(
+        'tag_id', 'post_id'))
+    stale = existing - links.keys()
+    if stale:
+        PostTag.objects.filter(reduce(or_, (
+            Q(tag_id=tag_id, post_id=post_id) for tag_id, post_id in stale
+        ))).delete()
+    PostTag.objects.bulk_create(
+        (PostTag(tag_id=tag_id, post_id=post_id, pub_date=pub_date)
+         for (tag_id, post_id), pub_date in links.items()
+         if (tag_id, post_id) not in existing),
+        ignore_conflicts=True)
+
+
+def sync(post):
+    sync_many([(post.pk, post.text, post.pub_date)])
@@ -0,0 +1,89 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.template.loader import get_template
+from django.utils.html import format_html, format_html_join
+from django.utils.safestring import mark_safe
+
+from posts import thumbnails
+
+register = template.Library()
+
+CARD_KEY = 'post_card:{pk}:{edited}:{comments}:{variant}'
+
+
+def card_key(post, variant):
+    """Ключ карточки меняется при правке поста и новом комментарии."""
+    return CARD_KEY.format(pk=post.pk, edited=post.edited.timestamp(),
+                           comments=post.comment_count, variant=variant)
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts):
+    """Карточки includes/post_inf.html для страницы ленты из кэша.
+
+    Все карточки страницы читаются одним get_many; отрисовываются и
+    кладутся в кэш только отсутствующие.
+    """
+    request = context['request']
+    variant = request.resolver_match.view_name
+    keys = {card_key(post, variant): post for post in posts}
+    cards = cache.get_many(keys)
+    missing = {}
+    card_template = get_template('includes/post_inf.html')
+    # Миниатюры всех недостающих карточек одним заходом в kvstore.
+    ready = thumbnails.ready_many(
+        (post.image for key, post in keys.items() if key not in cards),
+        'card')
+    for key, post in keys.items():
+        if key not in cards:
+            missing[key] = cards[key] = card_template.render(
+                {'post': post, 'request': request, 'thumbnails': ready})
+    if missing:
+        cache.set_many(missing, settings.POST_CARD_CACHE_TIMEOUT)
+    return [mark_safe(cards[key]) for key in keys]
+
+
+@register.simple_tag(takes_context=True)
+def ready_thumbnail(context, image, size):
+    """Готовая миниатюра из kvstore sorl или None; ничего не нарезает.
+
+    Если post_cards уже выбрал миниатюры страницы, берёт из них.
+    """
+    prefetched = context.get('thumbnails')
+    if prefetched is not None and image:
+        return prefetched.get(image.name)
+    return thumbnails.ready(image, size)
+
+
+def _srcset(variants):
+    return ', '.join(
+        f'{default_storage.url(variant["name"])} {variant["width"]}w'
+        for variant in variants)
+
+
+@register.simple_tag
+def responsive_image(post):
+    """<picture> по вариантам картинки поста: srcset, sizes и размеры.
+
+    Не-JPEG варианты идут в <source>, JPEG - в запасной <img>.
+    Пустая строка, пока вариантов нет.
+    """
+    by_type = {}
+    for variant in thumbnails.variants(post):
+        by_type.setdefault(variant['type'], []).append(variant)
+    if not by_type:
+        return ''
+    fallback = by_type.pop('image/jpeg', None) or next(iter(by_type.values()))
+    largest = fallback[-1]
+    sizes = settings.IMAGE_VARIANT_SIZES
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        ((mime, _srcset(variants), sizes)
+         for mime, variants in by_type.items()))
+    return format_html(
+        '<picture>{}<img class="card-img my-2" src="{}" srcset="{}" '
+        'sizes="{}" width="{}" height="{}" loading="lazy" alt=""></picture>',
+        sources, default_storage.url(largest['name']), _srcset(fallback),
+        sizes, largest['width'], largest['height'])
@@ -0,0 +1,60 @@
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Follow, Group, Post, User
+from ..paginators import EstimatedCountPaginator
+
+
+class AdminChangelistTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        cls.auth = User.objects.create_user(username='auth')
+        cls.user = User.objects.create_user(username='user')
+        cls.group = Group.objects.create(title='Группа', slug='test-slug')
+        cls.posts = [
+            Post.objects.create(author=cls.auth, text=f'Пост про сову {n}')
+            for n in range(3)
+        ]
+        cls.other = Post.objects.create(author=cls.auth, text='Про филина')
+        Follow.objects.create(user=cls.user, author=cls.auth)
+        Follow.objects.create(user=cls.auth, author=cls.admin)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def changelist(self, model, **params):
+        url = reverse(f'admin:posts_{model}_changelist')
+        return self.client.get(url, params).context['cl']
+
+    def test_search_results(self):
+        """Поиск в админке идёт по индексам."""
+        cases = (
+            ('post', 'сов', {post.pk for post in self.posts}),
+            ('follow', 'user', {Follow.objects.get(user=self.user).pk}),
+            ('group', 'test-slug', {self.group.pk}),
+        )
+        for model, query, expected in cases:
+            with self.subTest(model=model):
+                cl = self.changelist(model, q=query)
+                self.assertEqual({obj.pk for obj in cl.result_list},
+                                 expected)
+                self.assertIsNone(cl.full_result_count)
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=2)
+    def test_estimated_count(self):
+        """За пределом число строк оценивается, страницы открываются."""
+        queryset = Post.objects.order_by('pk')
+        paginator = EstimatedCountPaginator(queryset, 2)
+        self.assertEqual(paginator.count, self.other.pk)
+        self.assertTrue(paginator.estimated)
+        filtered = EstimatedCountPaginator(
+            queryset.filter(text__startswith='Пост'), 1)
+        self.assertEqual(filtered.count, 2)
+        self.assertEqual(list(filtered.page(3)), [self.posts[2]])
+        exact = EstimatedCountPaginator(queryset.filter(pk=self.other.pk), 1)
+        self.assertEqual(exact.count, 1)
+        self.assertFalse(exact.estimated)
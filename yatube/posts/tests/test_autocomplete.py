@@ -0,0 +1,71 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..autocomplete import PrefixIndex
+from ..models import Group, User
+
+
+class AutocompleteTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for username in ('Anna', 'anton', 'boris'):
+            User.objects.create_user(username=username)
+        cls.group = Group.objects.create(title='Антонимы', slug='ant-words')
+        cls.AUTOCOMPLETE = reverse('posts:autocomplete')
+
+    def setUp(self):
+        # Новые поколения: индекс строится по базе этого теста.
+        cache.clear()
+        self.client = Client()
+
+    def suggest(self, prefix, **params):
+        return self.client.get(self.AUTOCOMPLETE, {'q': prefix, **params})
+
+    def test_prefix_index(self):
+        """Префикс ищется бинарным поиском, значения не повторяются."""
+        index = PrefixIndex([('bb', 2), ('ab', 1), ('abc', 1), ('b', 3)])
+        self.assertEqual(index.search('a', 10), [1])
+        self.assertEqual(index.search('b', 1), [3])
+        self.assertEqual(index.search('c', 10), [])
+        merged = index.merged([('c', 4), ('aa', 5)])
+        self.assertEqual(merged.keys, ['aa', 'ab', 'abc', 'b', 'bb', 'c'])
+        self.assertEqual(merged.search('a', 10), [5, 1])
+        self.assertEqual(len(index), 4)
+
+    def test_suggestions(self):
+        """Пользователи без учёта регистра и группы по slug и названию."""
+        data = self.suggest('AN').json()
+        self.assertEqual([user['username'] for user in data['users']],
+                         ['Anna', 'anton'])
+        self.assertEqual(data['users'][1]['url'],
+                         reverse('posts:profile', args=('anton',)))
+        self.assertEqual(data['groups'], [{
+            'slug': 'ant-words', 'title': 'Антонимы',
+            'url': reverse('posts:group_posts_list', args=('ant-words',)),
+        }])
+        self.assertEqual(len(self.suggest('ант').json()['groups']), 1)
+        self.assertEqual(len(self.suggest('a', limit=1).json()['users']), 1)
+        self.assertEqual(self.suggest('').json(), {'users': [], 'groups': []})
+
+    def test_late_commit_with_lower_pk_found(self):
+        """Строка с pk ниже уже дочитанного не теряется."""
+        last = User.objects.order_by('pk').last().pk
+        User.objects.create(pk=last + 10, username='zoya')
+        self.assertEqual(len(self.suggest('zo').json()['users']), 1)
+        User.objects.create(pk=last + 5, username='zlata')
+        self.assertEqual(len(self.suggest('zl').json()['users']), 1)
+
+    def test_index_follows_changes(self):
+        """Новые, переименованные и удалённые имена видны сразу."""
+        self.suggest('a')
+        User.objects.create_user(username='andrey')
+        self.assertEqual(len(self.suggest('and').json()['users']), 1)
+        user = User.objects.get(username='boris')
+        user.username = 'alla'
+        user.save()
+        self.assertEqual(len(self.suggest('all').json()['users']), 1)
+        self.assertEqual(self.suggest('bor').json()['users'], [])
+        self.group.delete()
+        self.assertEqual(self.suggest('ant').json()['groups'], [])
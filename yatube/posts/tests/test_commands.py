@@ -0,0 +1,416 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from .. import media, search, thumbnails, timelines
+from ..models import (
+    AuthorStats, Comment, Follow, Group, MediaBlob, Post, PostTag,
+    ThumbnailJob, User,
+)
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+
+
+class RecountCommentsCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.auth = User.objects.create_user(username='auth')
+        cls.posts = Post.objects.bulk_create(
+            Post(author=cls.auth, text=f'Пост {number}')
+            for number in range(5))
+        cls.posts = list(Post.objects.order_by('pk'))
+        Comment.objects.bulk_create(
+            Comment(post=cls.posts[0], author=cls.auth, text='Коммент')
+            for _ in range(3))
+
+    def test_recount_fixes_drift(self):
+        """Команда выставляет реальные счётчики пакетами."""
+        Post.objects.filter(pk=self.posts[1].pk).update(comment_count=7)
+        call_command('recount_comments', batch_size=2, stdout=StringIO())
+        counts = dict(Post.objects.values_list('pk', 'comment_count'))
+        self.assertEqual(counts[self.posts[0].pk], 3)
+        self.assertEqual(counts[self.posts[1].pk], 0)
+        self.assertEqual(sum(counts.values()), 3)
+
+
+class RebuildSearchIndexCommandTest(TestCase):
+    def test_rebuild_indexes_posts_missed_by_signals(self):
+        """Команда индексирует посты, созданные в обход сигналов."""
+        auth = User.objects.create_user(username='auth')
+        Post.objects.bulk_create(
+            Post(author=auth, text=f'Филин {number}') for number in range(5))
+        self.assertFalse(search.search('филин', None, 10).object_list)
+        search.index([(10 ** 6, 'Филин-призрак')])
+        out = StringIO()
+        call_command('rebuild_search_index', batch_size=2, stdout=out)
+        self.assertEqual(len(search.search('филин', None, 10)), 5)
+        self.assertIn('5, удалено лишних: 1', out.getvalue())
+
+
+class BackfillTagsCommandTest(TestCase):
+    def test_backfill_parses_existing_posts(self):
+        """Команда разбирает теги постов, созданных в обход вьюх."""
+        auth = User.objects.create_user(username='auth')
+        Post.objects.bulk_create(
+            Post(author=auth, text=f'#old {number}') for number in range(5))
+        call_command('backfill_tags', batch_size=2, stdout=StringIO())
+        self.assertEqual(
+            PostTag.objects.filter(tag__name='old').count(), 5)
+
+
+class RepairUserStatsCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.auth = User.objects.create_user(username='auth')
+        cls.user = User.objects.create_user(username='user')
+        Post.objects.create(author=cls.auth, text='Пост')
+        Follow.objects.create(user=cls.user, author=cls.auth)
+
+    def test_repair_creates_and_fixes_stats(self):
+        """Команда создаёт недостающие и чинит разъехавшиеся записи."""
+        AuthorStats.objects.create(user=self.user, posts_count=5)
+        call_command('repair_user_stats', batch_size=1, stdout=StringIO())
+        values = dict(
+            (stats.user_id, (stats.posts_count, stats.followers_count,
+                             stats.followings_count))
+            for stats in AuthorStats.objects.all())
+        self.assertEqual(values, {self.auth.pk: (1, 1, 0),
+                                  self.user.pk: (0, 0, 1)})
+
+
+class BulkImportCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.auth = User.objects.create_user(username='auth')
+        cls.user = User.objects.create_user(username='user')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+
+    def setUp(self):
+        cache.clear()
+
+    def _import(self, kind, content, suffix='.jsonl', **options):
+        with tempfile.NamedTemporaryFile(
+                'w', suffix=suffix, encoding='utf-8', delete=False) as file:
+            file.write(content)
+        self.addCleanup(os.remove, file.name)
+        out, err = StringIO(), StringIO()
+        call_command('bulk_import', kind, file.name, stdout=out,
+                     stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_posts_imported_with_side_effects(self):
+        """Посты пишутся пакетами, а индексы и счётчики обновляются."""
+        rows = [
+            {'author': 'auth', 'text': f'Филин #ночь {number}',
+             'group': 'group', 'pub_date': f'2020-01-0{number + 1}T10:00'}
+            for number in range(5)
+        ]
+        lines = [json.dumps(row) for row in rows]
+        lines[2:2] = ['не json', json.dumps({'author': 'auth', 'text': ''}),
+                      json.dumps({'author': 'nobody', 'text': 'Текст'}),
+                      json.dumps({'author': 'auth', 'text': 'Текст',
+                                  'group': 'missing'})]
+        out, err = self._import('posts', '\n'.join(lines), batch_size=2)
+        self.assertIn('Импортировано: 5, с ошибками: 4', out)
+        for number in (3, 4, 5, 6):
+            with self.subTest(number=number):
+                self.assertIn(f'строка {number}:', err)
+        posts = Post.objects.filter(author=self.auth).order_by('pub_date')
+        self.assertEqual(
+            [post.pub_date.day for post in posts], [1, 2, 3, 4, 5])
+        self.assertEqual(posts.filter(group=self.group).count(), 5)
+        self.assertEqual(len(search.search('филин', None, 10)), 5)
+        self.assertEqual(PostTag.objects.filter(tag__name='ночь').count(), 5)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.auth).posts_count, 5)
+
+    def test_follower_timeline_includes_imported_posts(self):
+        """Лента подписчика после импорта строится с новыми постами."""
+        Follow.objects.create(user=self.user, author=self.auth)
+        Post.objects.create(author=self.auth, text='Старый пост')
+        timelines.rebuild(self.user)
+        rows = [{'author': 'auth', 'text': f'Пост {number}'}
+                for number in range(3)]
+        self._import('posts', '\n'.join(json.dumps(row) for row in rows),
+                     batch_size=1)
+        self.assertEqual(len(timelines.feed(self.user)[0]), 4)
+
+    def test_rows_with_wrong_types_reported(self):
+        """Поля не того типа не роняют импорт, а идут в ошибки."""
+        rows = [
+            {'author': 'auth', 'text': 'Дата числом', 'pub_date': 1577836800},
+            {'author': ['auth'], 'text': 'Автор списком'},
+            {'author': 'auth', 'text': {'a': 1}},
+            {'author': 'auth', 'text': 'Годный'},
+        ]
+        out, err = self._import(
+            'posts', '\n'.join(json.dumps(row) for row in rows))
+        self.assertIn('Импортировано: 1, с ошибками: 3', out)
+        for number in (1, 2, 3):
+            with self.subTest(number=number):
+                self.assertIn(f'строка {number}:', err)
+
+    def test_comments_imported_from_csv(self):
+        """Комментарии из CSV увеличивают Post.comment_count."""
+        post = Post.objects.create(author=self.auth, text='Пост')
+        content = (
+            'post,author,text,created\n'
+            f'{post.pk},user,Первый,2020-01-01T10:00:00+00:00\n'
+            f'{post.pk},user,Второй,\n'
+            f'{post.pk + 1},user,Чужой,\n'
+        )
+        out, _ = self._import('comments', content, suffix='.csv')
+        self.assertIn('Импортировано: 2, с ошибками: 1', out)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 2)
+        self.assertEqual(
+            Comment.objects.get(text='Первый').created.year, 2020)
+
+    def test_follows_imported_once(self):
+        """Повторные подписки и подписки на себя пропускаются."""
+        Follow.objects.create(user=self.user, author=self.auth)
+        AuthorStats.objects.create(user=self.auth, followers_count=1)
+        rows = [
+            {'user': 'user', 'author': 'auth'},
+            {'user': 'auth', 'author': 'user'},
+            {'user': 'auth', 'author': 'user'},
+            {'user': 'auth', 'author': 'auth'},
+            {'user': 'new', 'author': 'auth'},
+        ]
+        out, _ = self._import(
+            'follows', '\n'.join(json.dumps(row) for row in rows),
+            create_authors=True)
+        self.assertIn('Импортировано: 2, с ошибками: 3', out)
+        self.assertEqual(Follow.objects.filter(author=self.auth).count(), 2)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.auth).followers_count, 2)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.user).followers_count, 1)
+        self.assertFalse(
+            User.objects.get(username='new').has_usable_password())
+
+
+class ExportDataCommandTest(TestCase):
+    def test_export_resumes_by_cursor(self):
+        """Выгрузку можно продолжить с курсора последней строки."""
+        auth = User.objects.create_user(username='auth')
+        for number in range(5):
+            Post.objects.create(author=auth, text=f'Пост {number}')
+        out, err = StringIO(), StringIO()
+        call_command('export_data', 'posts', batch_size=2, stdout=out,
+                     stderr=err)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(len(rows), 5)
+        self.assertIn(f'Выгружено строк: 5, курсор: {rows[-1]["cursor"]}',
+                      err.getvalue())
+        out = StringIO()
+        call_command('export_data', 'posts', format='csv', author='auth',
+                     cursor=rows[2]['cursor'], stdout=out, stderr=StringIO())
+        self.assertEqual(
+            [line.split(',')[0] for line in out.getvalue().splitlines()],
+            [str(row['id']) for row in rows[3:]])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailWorkerCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.auth = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.auth)
+
+    def test_thumbnails_made_by_worker_not_by_request(self):
+        """Миниатюра режется воркером, страница до этого - с заглушкой."""
+        image = SimpleUploadedFile('small.gif', SMALL_GIF,
+                                   content_type='image/gif')
+        self.client.post(reverse('posts:post_create'),
+                         {'text': 'С картинкой', 'image': image})
+        post = Post.objects.get(text='С картинкой')
+        self.assertTrue(
+            ThumbnailJob.objects.filter(image=post.image.name).exists())
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'thumbnail-placeholder.svg')
+        call_command('thumbnail_worker', workers=0, once=True,
+                     stdout=StringIO())
+        self.assertFalse(ThumbnailJob.objects.exists())
+        self.assertIsNotNone(thumbnails.ready(post.image, 'card'))
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'thumbnail-placeholder.svg')
+        self.assertContains(response, 'srcset')
+
+    def test_worker_pool(self):
+        """Пул процессов режет в том же MEDIA_ROOT, kvstore пишет родитель."""
+        image = SimpleUploadedFile('small.gif', SMALL_GIF,
+                                   content_type='image/gif')
+        self.client.post(reverse('posts:post_create'),
+                         {'text': 'Через пул', 'image': image})
+        post = Post.objects.get(text='Через пул')
+        out, err = StringIO(), StringIO()
+        call_command('thumbnail_worker', workers=1, once=True, stdout=out,
+                     stderr=err)
+        self.assertEqual(err.getvalue(), '')
+        self.assertIn('Готово: 1, с ошибкой: 0', out.getvalue())
+        self.assertFalse(ThumbnailJob.objects.exists())
+        thumbnail = thumbnails.ready(post.image, 'card')
+        self.assertIsNotNone(thumbnail)
+        self.assertTrue(thumbnail.exists())
+
+    def test_page_thumbnails_fetched_in_one_query(self):
+        """Миниатюры страницы читаются из kvstore одним запросом."""
+        for number in range(3):
+            image = SimpleUploadedFile(f'small{number}.gif', SMALL_GIF,
+                                       content_type='image/gif')
+            self.client.post(reverse('posts:post_create'),
+                             {'text': f'Пост {number}', 'image': image})
+        call_command('thumbnail_worker', workers=0, once=True,
+                     stdout=StringIO())
+        cache.clear()
+        images = [post.image for post in Post.objects.all()]
+        with self.assertNumQueries(1):
+            ready = thumbnails.ready_many(images, 'card')
+        with self.assertNumQueries(0):
+            thumbnails.ready_many(images, 'card')
+        self.assertEqual(
+            {name: thumbnail.url for name, thumbnail in ready.items()},
+            {image.name: thumbnails.ready(image, 'card').url
+             for image in images})
+
+    def test_responsive_variants_stored_next_to_original(self):
+        """Воркер кладёт варианты рядом с оригиналом, карточка - srcset."""
+        buffer = BytesIO()
+        Image.new('RGB', (700, 500), 'red').save(buffer, 'JPEG')
+        image = SimpleUploadedFile('big.jpg', buffer.getvalue(),
+                                   content_type='image/jpeg')
+        self.client.post(reverse('posts:post_create'),
+                         {'text': 'Большая', 'image': image})
+        call_command('thumbnail_worker', workers=0, once=True,
+                     stdout=StringIO())
+        post = Post.objects.get(text='Большая')
+        variants = thumbnails.variants(post)
+        jpegs = [variant for variant in variants
+                 if variant['type'] == 'image/jpeg']
+        self.assertEqual([(variant['width'], variant['height'])
+                          for variant in jpegs], [(320, 113), (640, 226)])
+        for variant in variants:
+            with self.subTest(variant=variant['name']):
+                self.assertTrue(variant['name'].startswith(
+                    os.path.splitext(post.image.name)[0]))
+                self.assertTrue(default_storage.exists(variant['name']))
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, f'{jpegs[1]["name"]} 640w')
+        self.assertContains(response, 'width="640" height="226"')
+
+    @override_settings(POST_IMAGE_NORMALIZED_SIDE=500)
+    def test_original_normalized_by_worker(self):
+        """Воркер поворачивает оригинал по EXIF, ужимает и чистит EXIF."""
+        buffer = BytesIO()
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: повернуть на 90° по часовой
+        Image.new('RGB', (1000, 600), 'red').save(
+            buffer, 'JPEG', exif=exif.tobytes())
+        image = SimpleUploadedFile('photo.jpg', buffer.getvalue(),
+                                   content_type='image/jpeg')
+        self.client.post(reverse('posts:post_create'),
+                         {'text': 'Фото', 'image': image})
+        call_command('thumbnail_worker', workers=0, once=True,
+                     stdout=StringIO())
+        name = Post.objects.get(text='Фото').image.name
+        with default_storage.open(name) as stored:
+            normalized = Image.open(stored)
+            self.assertEqual(normalized.size, (300, 500))
+            self.assertFalse(normalized.getexif())
+
+    def test_failed_job_kept_after_attempts(self):
+        """Битая картинка остаётся в очереди с текстом ошибки."""
+        thumbnails.enqueue('posts/missing.gif')
+        call_command('thumbnail_worker', workers=0, once=True,
+                     stdout=StringIO(), stderr=StringIO())
+        job = ThumbnailJob.objects.get()
+        self.assertEqual(job.attempts, thumbnails.MAX_ATTEMPTS)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class GcMediaCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.auth = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_shared_blob_removed_after_last_reference(self):
+        """Одинаковые загрузки - один файл; он удаляется без ссылок."""
+        client = Client()
+        client.force_login(self.auth)
+        for number in range(2):
+            client.post(reverse('posts:post_create'), {
+                'text': f'Мем {number}',
+                'image': SimpleUploadedFile(f'meme{number}.gif', SMALL_GIF),
+            })
+        first, second = Post.objects.order_by('pk')
+        self.assertEqual(first.image.name, second.image.name)
+        name = first.image.name
+        self.assertEqual(MediaBlob.objects.get(name=name).refcount, 2)
+        first.delete()
+        call_command('gc_media', grace=0, stdout=StringIO())
+        self.assertTrue(default_storage.exists(name))
+        self._replace_image(client, second)
+        self.assertEqual(MediaBlob.objects.get(name=name).refcount, 0)
+        call_command('gc_media', grace=0, stdout=StringIO())
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+
+    def test_recently_released_blob_survives_grace(self):
+        """Отсчёт --grace идёт от последнего release, а не от создания."""
+        name = default_storage.save('posts/old.gif', BytesIO(SMALL_GIF))
+        MediaBlob.objects.create(name=name, refcount=1)
+        MediaBlob.objects.filter(name=name).update(
+            updated=timezone.now() - timedelta(hours=2))
+        media.release(name)
+        call_command('gc_media', grace=60, stdout=StringIO())
+        self.assertTrue(default_storage.exists(name))
+        self.assertTrue(MediaBlob.objects.filter(name=name).exists())
+
+    def _replace_image(self, client, post):
+        """Меняет картинку поста через post_edit."""
+        buffer = BytesIO()
+        Image.new('RGB', (10, 10), 'blue').save(buffer, 'PNG')
+        client.post(reverse('posts:post_edit', args=(post.pk,)), {
+            'text': post.text,
+            'image': SimpleUploadedFile('other.png', buffer.getvalue()),
+        })
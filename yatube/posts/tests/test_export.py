@@ -0,0 +1,96 @@
+import csv
+import json
+
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Group, Post, User
+from ..paginators import decode_cursor, encode_cursor
+
+
+@override_settings(EXPORT_BATCH_SIZE=2)
+class ExportViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.auth = User.objects.create_user(username='auth')
+        cls.user = User.objects.create_user(username='user')
+        cls.group = Group.objects.create(title='Группа', slug='test-slug')
+        cls.posts = [
+            Post.objects.create(author=cls.auth, group=cls.group,
+                                text=f'Пост {number}')
+            for number in range(5)
+        ]
+        Post.objects.create(author=cls.user, text='Чужой пост')
+        Comment.objects.create(post=cls.posts[0], author=cls.auth,
+                               text='Свой, "с кавычками"')
+        Comment.objects.create(post=cls.posts[0], author=cls.user,
+                               text='Чужой')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.auth)
+
+    def export(self, kind, **params):
+        response = self.client.get(
+            reverse('posts:export', args=(kind,)), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def jsonl(self, kind, **params):
+        return [json.loads(line)
+                for line in self.export(kind, **params).splitlines()]
+
+    def test_only_own_posts_in_key_order(self):
+        """Выгружаются посты пользователя от старых к новым."""
+        rows = self.jsonl('posts')
+        self.assertEqual([row['id'] for row in rows],
+                         [post.pk for post in self.posts])
+        self.assertEqual(rows[0]['author'], 'auth')
+        self.assertEqual(rows[0]['group'], 'test-slug')
+        self.assertEqual(rows[0]['pub_date'],
+                         self.posts[0].pub_date.isoformat())
+
+    def test_export_resumes_from_any_row(self):
+        """Курсор строки продолжает выгрузку сразу после неё."""
+        rows = self.jsonl('posts')
+        for number, row in enumerate(rows):
+            with self.subTest(number=number):
+                rest = self.jsonl('posts', cursor=row['cursor'])
+                self.assertEqual(rest, rows[number + 1:])
+
+    def test_csv_export(self):
+        """CSV с заголовком и экранированием."""
+        rows = list(csv.DictReader(
+            self.export('comments', format='csv').splitlines()))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['text'], 'Свой, "с кавычками"')
+        self.assertEqual(rows[0]['post'], str(self.posts[0].pk))
+
+    def test_bad_requests(self):
+        """Битый курсор и формат - 400, неизвестная выгрузка - 404."""
+        cases = (
+            ('posts', {'cursor': 'мусор'}, 400),
+            ('posts', {'cursor': 'WyJuIixbMV1d'}, 400),
+            ('posts', {'cursor': 'WyJuIixbIngiLDFdXQ'}, 400),
+            ('posts', {'format': 'xml'}, 400),
+            ('follows', {}, 404),
+        )
+        for kind, params, status in cases:
+            with self.subTest(kind=kind, params=params):
+                response = self.client.get(
+                    reverse('posts:export', args=(kind,)), params)
+                self.assertEqual(response.status_code, status)
+
+    def test_backward_cursor_rejected(self):
+        """Курсор назад ('p') выгрузке не подходит."""
+        row = self.jsonl('posts')[0]
+        _, values = decode_cursor(row['cursor'])
+        response = self.client.get(reverse('posts:export', args=('posts',)),
+                                   {'cursor': encode_cursor('p', values)})
+        self.assertEqual(response.status_code, 400)
+
+    def test_anonymous_redirected(self):
+        response = Client().get(reverse('posts:export', args=('posts',)))
+        self.assertEqual(response.status_code, 302)
@@ -1,10 +1,13 @@
+import hashlib
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.conf import settings
 from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
 
 from ..models import Group, Post, Comment, User
 
@@ -29,6 +32,9 @@ class PostsFormsPagesTests(TestCase):
             b'\x00\x00\x01\x00\x01\x00\x00\x02'
             b'\x02\x4c\x01\x00\x3b'
         )
+        # Картинки хранятся под именем из хэша содержимого.
+        digest = hashlib.sha256(cls.small_gif).hexdigest()
+        cls.image_name = f'posts/{digest[:2]}/{digest}.gif'
         cls.image = SimpleUploadedFile(
             'small.gif', cls.small_gif, content_type='image/gif',
         )
@@ -72,7 +78,7 @@ class PostsFormsPagesTests(TestCase):
             (new_post.text, form_data['text']),
             (new_post.author, self.auth),
             (new_post.group.id, form_data['group']),
-            (new_post.image, f'posts/{new_image.name}'),
+            (new_post.image, self.image_name),
         ]
         for filds, expected in filds_expected:
             with self.subTest(filds=filds):
@@ -104,12 +110,38 @@ class PostsFormsPagesTests(TestCase):
             (edit_post.text, form_data['text']),
             (edit_post.author, self.post.author),
             (edit_post.group.id, form_data['group']),
-            (edit_post.image, f'posts/{another_image.name}'),
+            (edit_post.image, self.image_name),
         ]
         for filds, expected in filds_expected:
             with self.subTest(filds=filds):
                 self.assertEqual(filds, expected)
 
+    def test_image_limits_checked_on_upload(self):
+        """Размер файла, формат, стороны и целостность картинки."""
+        png = BytesIO()
+        Image.new('RGB', (1, 1)).save(png, 'PNG')
+        # Испорченные данные IDAT: заголовок цел, контрольная сумма нет.
+        broken_png = bytearray(png.getvalue())
+        broken_png[broken_png.index(b'IDAT') + 5] ^= 0xFF
+        cases = (
+            ({'POST_IMAGE_MAX_BYTES': 20}, 'small.gif', self.small_gif,
+             'Файл больше'),
+            ({'POST_IMAGE_MAX_DIMENSION': 0}, 'small.gif', self.small_gif,
+             'пикселей по стороне'),
+            ({}, 'small.txt', b'not an image', 'Загрузите правильное'),
+            ({}, 'broken.png', bytes(broken_png), 'Загрузите правильное'),
+        )
+        for limits, name, content, error in cases:
+            with self.subTest(name=name, limits=limits):
+                with override_settings(**limits):
+                    response = self.authorized_auth.post(
+                        reverse('posts:post_create'),
+                        {'text': 'Слишком большой',
+                         'image': SimpleUploadedFile(name, content)})
+                self.assertContains(response, error)
+                self.assertFalse(
+                    Post.objects.filter(text='Слишком большой').exists())
+
     def test_added_commit_in_database(self):
         """после успешной отправки комментарий появляется в базе."""
         Comment.objects.all().delete()
@@ -134,3 +166,28 @@ class PostsFormsPagesTests(TestCase):
         for filds, expected in filds_expected:
             with self.subTest(filds=filds):
                 self.assertEqual(filds, expected)
+
+    def test_comment_count_follows_add_and_delete(self):
+        """Счётчик комментариев меняется при добавлении и удалении."""
+        self.authorized_auth.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            data={'text': 'Новый коммит'})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        comment = Comment.objects.get(post=self.post)
+        self.authorized_auth.get(
+            reverse('posts:del_comment', kwargs={'comment_id': comment.id}))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+
+    def test_delete_comment_of_deleted_post(self):
+        """Комментарий удалённого поста (post=NULL) удаляется без ошибки."""
+        post = Post.objects.create(author=self.auth, text='Удаляемый')
+        comment = Comment.objects.create(post=post, author=self.auth,
+                                         text='Осиротевший')
+        post.delete()
+        response = self.authorized_auth.get(
+            reverse('posts:del_comment', kwargs={'comment_id': comment.id}))
+        self.assertRedirects(response, reverse(
+            'posts:profile', kwargs={'username': self.auth.username}))
+        self.assertFalse(Comment.objects.filter(pk=comment.pk).exists())
@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Group, Post, User
+from ..search import filter_posts, match_expression, terms
+
+
+class SearchViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.auth = User.objects.create_user(username='auth')
+        cls.user = User.objects.create_user(username='user')
+        cls.group = Group.objects.create(title='Группа', slug='test-slug')
+        cls.strong = Post.objects.create(
+            author=cls.auth, group=cls.group,
+            text='Ёжик в тумане. Ёжик нашёл ёжика.')
+        cls.weak = Post.objects.create(
+            author=cls.user, text='Про ежика и лошадку, а ещё про сову.')
+        cls.other = Post.objects.create(author=cls.auth, text='Совсем другое')
+        cls.SEARCH = reverse('posts:search')
+
+    def setUp(self):
+        self.client = Client()
+
+    def found(self, **params):
+        response = self.client.get(self.SEARCH, params)
+        return [post.pk for post in response.context['page_obj']]
+
+    def test_terms_are_sanitized(self):
+        """Операторы FTS5 из запроса не попадают в MATCH."""
+        self.assertEqual(terms('ёжик" OR NEAR(*'), ['ежик', 'OR', 'NEAR'])
+        self.assertEqual(match_expression(['ёжик', 'в']), '"ёжик" "в"*')
+
+    def test_results_ranked_and_folded(self):
+        """Регистр и ё не важны, частое совпадение выше."""
+        self.assertEqual(self.found(q='ЕЖИК'), [self.strong.pk, self.weak.pk])
+        self.assertEqual(self.found(q='лошад'), [self.weak.pk])
+
+    def test_filter_posts_keeps_every_match(self):
+        """filter_posts сужает queryset до всех совпавших постов."""
+        self.assertEqual(
+            set(filter_posts(Post.objects.all(), 'ежик').values_list(
+                'pk', flat=True)),
+            {self.strong.pk, self.weak.pk})
+
+    def test_filters(self):
+        """Поиск сужается группой и автором."""
+        cases = (
+            ({'group': self.group.slug}, [self.strong.pk]),
+            ({'author': self.user.username}, [self.weak.pk]),
+        )
+        for params, expected in cases:
+            with self.subTest(params=params):
+                self.assertEqual(self.found(q='ежик', **params), expected)
+        response = self.client.get(self.SEARCH,
+                                   {'q': 'ежик', 'author': 'nobody'})
+        self.assertIsNone(response.context['page_obj'])
+        self.assertTrue(response.context['form'].errors)
+
+    def test_index_follows_saves_and_deletes(self):
+        """Правка и удаление поста сразу видны в поиске."""
+        self.other.text = 'Теперь про ежика'
+        self.other.save()
+        self.assertIn(self.other.pk, self.found(q='ежик'))
+        self.other.delete()
+        self.assertEqual(self.found(q='теперь'), [])
+
+    def test_cursor_pages(self):
+        """Курсор листает результаты без повторов и хранит запрос."""
+        Post.objects.bulk_create(
+            Post(author=self.auth, text=f'Сова номер {number}')
+            for number in range(settings.NUMB_POSTS + 2))
+        # bulk_create идёт мимо сигналов.
+        for post in Post.objects.filter(text__startswith='Сова'):
+            post.save()
+        response = self.client.get(self.SEARCH, {'q': 'сова'})
+        first = [post.pk for post in response.context['page_obj']]
+        cursor = response.context['page_obj'].next_cursor
+        self.assertContains(
+            response, f'?q=%D1%81%D0%BE%D0%B2%D0%B0&amp;cursor={cursor}')
+        second = self.found(q='сова', cursor=cursor)
+        self.assertEqual(len(first), settings.NUMB_POSTS)
+        self.assertEqual(len(first + second), settings.NUMB_POSTS + 2)
+        self.assertFalse(set(first) & set(second))
+        response = self.client.get(self.SEARCH, {
+            'q': 'сова',
+            'cursor': self.client.get(self.SEARCH, {
+                'q': 'сова', 'cursor': cursor,
+            }).context['page_obj'].previous_cursor,
+        })
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']], first)
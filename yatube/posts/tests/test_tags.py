@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Post, User
+from ..tags import extract
+
+
+class TagsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.auth = User.objects.create_user(username='auth')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.auth)
+
+    def tag_names(self, post):
+        return set(post.post_tags.values_list('tag__name', flat=True))
+
+    def test_extract(self):
+        """Теги нормализуются, цифры, якоря и ## не считаются."""
+        self.assertEqual(
+            extract('#Котики и #котики, #2023, a#b ##x #ёж_2 &#39;'),
+            {'котики', 'ёж_2'})
+
+    def test_create_and_edit_sync_tags(self):
+        """Теги разбираются при создании и правке поста."""
+        self.client.post(reverse('posts:post_create'),
+                         {'text': 'Про #cats и #dogs'})
+        post = Post.objects.get()
+        self.assertEqual(self.tag_names(post), {'cats', 'dogs'})
+        self.client.post(reverse('posts:post_edit', args=(post.pk,)),
+                         {'text': 'Только #Cats и #birds'})
+        self.assertEqual(self.tag_names(post), {'cats', 'birds'})
+        self.assertEqual(
+            set(post.post_tags.values_list('pub_date', flat=True)),
+            {post.pub_date})
+
+    def test_tag_feed_pages(self):
+        """Лента тега листается страницами и курсором."""
+        for number in range(settings.NUMB_POSTS + 2):
+            self.client.post(reverse('posts:post_create'),
+                             {'text': f'Пост {number} #feed'})
+        self.client.post(reverse('posts:post_create'), {'text': 'Без тега'})
+        url = reverse('posts:tag_posts', args=('FEED',))
+        newest = list(Post.objects.filter(
+            text__contains='#feed').order_by('-pub_date', '-pk'))
+        response = self.client.get(url)
+        self.assertEqual(list(response.context['page_obj']),
+                         newest[:settings.NUMB_POSTS])
+        response = self.client.get(url, {'page': 2})
+        self.assertEqual(list(response.context['page_obj']),
+                         newest[settings.NUMB_POSTS:])
+        response = self.client.get(url, {'cursor': ''})
+        response = self.client.get(
+            url, {'cursor': response.context['page_obj'].next_cursor})
+        self.assertEqual(list(response.context['page_obj']),
+                         newest[settings.NUMB_POSTS:])
+        missing = reverse('posts:tag_posts', args=('none',))
+        self.assertEqual(self.client.get(missing).status_code, 404)
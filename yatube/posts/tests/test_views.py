@@ -1,3 +1,4 @@
+import hashlib
 import shutil
 import tempfile
 
@@ -8,9 +9,13 @@ from django.urls import reverse
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 
-from ..models import Group, Post, Comment, Follow, User
+from ..models import Group, Post, Comment, Follow, TimelineEntry, User
+from ..caching import invalidate_feeds
+from ..paginators import encode_cursor
 from ..forms import PostForm, CommentForm
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -34,6 +39,9 @@ class PostsViewsPagesTests(TestCase):
             b'\x00\x00\x01\x00\x01\x00\x00\x02'
             b'\x02\x4c\x01\x00\x3b'
         )
+        # Картинки хранятся под именем из хэша содержимого.
+        digest = hashlib.sha256(cls.small_gif).hexdigest()
+        cls.image_name = f'posts/{digest[:2]}/{digest}.gif'
         cls.image = SimpleUploadedFile(
             'small.gif', cls.small_gif, content_type='image/gif',
         )
@@ -78,7 +86,7 @@ class PostsViewsPagesTests(TestCase):
                           (post.group, self.post.group),
                           (post.author, self.post.author),
                           (post.pk, self.post.pk),
-                          (post.image, f'posts/{self.image.name}')]
+                          (post.image, self.image_name)]
         for value, expected in value_expected:
             with self.subTest(value=value):
                 self.assertEqual(value, expected)
@@ -167,15 +175,249 @@ class PostsViewsPagesTests(TestCase):
                                  self.POSTS - settings.NUMB_POSTS
                                  * (COUNT_PAG - 1))
 
+    def test_cursor_pages_context(self):
+        """Курсорная пагинация обходит ленту без пропусков и повторов."""
+        Post.objects.bulk_create(
+            Post(text=f'Новый пост {number}', group=self.group,
+                 author=self.auth) for number in range(self.POSTS))
+        expected = list(Post.objects.order_by('-pub_date', '-id'))
+        pages = []
+        cursor = ''
+        while cursor is not None:
+            page_obj = self.guest_client.get(
+                self.INDEX, {'cursor': cursor}).context['page_obj']
+            self.assertLessEqual(len(page_obj), settings.NUMB_POSTS)
+            pages.append(page_obj)
+            cursor = page_obj.next_cursor
+        self.assertEqual([post for page in pages for post in page],
+                         expected)
+        previous = self.guest_client.get(
+            self.INDEX, {'cursor': pages[1].previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(previous), list(pages[0]))
+        self.assertFalse(pages[0].has_previous())
+
+    def test_cursor_broken_token_gives_first_page(self):
+        """Битый курсор отдаёт первую страницу, а не ошибку."""
+        tokens = ('не-токен', 'WyJuIixbIngiLCJ5Il1d',
+                  encode_cursor('n', [[1], 1]),
+                  encode_cursor('n', [{'a': 1}, 1]))
+        for token in tokens:
+            with self.subTest(token=token):
+                page_obj = self.guest_client.get(
+                    self.INDEX, {'cursor': token}).context['page_obj']
+                self.assertEqual(list(page_obj), [self.post])
+
+    def test_feed_queries_do_not_grow_with_page(self):
+        """Число запросов ленты не зависит от числа постов на странице."""
+        pages = (self.INDEX, self.GROUP_POSTS, self.PROFILE)
+        Post.objects.update(image='')
+        for page in pages:
+            self.guest_client.get(page)
+        queries = []
+        for posts in (0, settings.NUMB_POSTS):
+            Post.objects.bulk_create(
+                Post(text='Пост', group=self.group, author=self.auth)
+                for _ in range(posts))
+            for page in pages:
+                cache.clear()
+                with CaptureQueriesContext(connection) as context:
+                    self.guest_client.get(page)
+                queries.append(len(context))
+        self.assertEqual(queries[:3], queries[3:])
+
+    def test_post_create_fans_out_to_followers(self):
+        """Новый пост попадает в материализованную ленту подписчика."""
+        self.authorized_auth.post(self.POST_CREATE, {'text': 'Разошлём'})
+        post = Post.objects.get(text='Разошлём')
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post=post).exists())
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.auth, post=post).exists())
+
+    @override_settings(TIMELINE_SIZE=3)
+    def test_timeline_capped_and_cleared_on_unfollow(self):
+        """Лента ограничена TIMELINE_SIZE и чистится при отписке."""
+        Post.objects.bulk_create(
+            Post(text=f'Пост {number}', author=self.auth)
+            for number in range(5))
+        self.authorized_auth.force_login(self.user)
+        page_obj = self.authorized_auth.get(
+            self.FOLLOW_INDEX).context['page_obj']
+        self.assertEqual(len(page_obj), 3)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user).count(), 3)
+        self.authorized_auth.get(reverse('posts:profile_unfollow',
+                                         kwargs={'username': self.auth}))
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.user).exists())
+
+    def test_empty_timeline_built_once(self):
+        """Пустая лента строится один раз: чтение ничего не пишет."""
+        self.authorized_auth.get(self.FOLLOW_INDEX)
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_auth.get(self.FOLLOW_INDEX)
+        self.assertFalse([
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))])
+
+    @override_settings(TIMELINE_SIZE=3)
+    def test_timeline_trimmed_on_fan_out(self):
+        """Раскладка срезает ленту до TIMELINE_SIZE и при равных датах."""
+        pub_date = self.post.pub_date
+        Post.objects.bulk_create(
+            Post(text=f'Пост {number}', author=self.auth)
+            for number in range(5))
+        posts = Post.objects.filter(text__startswith='Пост ')
+        posts.update(pub_date=pub_date)
+        TimelineEntry.objects.bulk_create(
+            TimelineEntry(user=self.user, post=post, pub_date=pub_date)
+            for post in posts)
+        self.authorized_auth.post(self.POST_CREATE, {'text': 'Свежий'})
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(user=self.user).order_by(
+                '-pub_date', '-post_id').values_list('post__text', flat=True)),
+            ['Свежий', 'Пост 4', 'Пост 3'])
+
+    @override_settings(FANOUT_FOLLOWER_THRESHOLD=1)
+    def test_popular_author_merged_on_read(self):
+        """Посты популярного автора не раскладываются, а подмешиваются."""
+        self.authorized_auth.post(self.POST_CREATE, {'text': 'Популярный'})
+        post = Post.objects.get(text='Популярный')
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.authorized_auth.force_login(self.user)
+        page_obj = self.authorized_auth.get(
+            self.FOLLOW_INDEX).context['page_obj']
+        self.assertEqual(list(page_obj), [post, self.post])
+
+    @override_settings(FANOUT_FOLLOWER_THRESHOLD=2)
+    def test_threshold_crossing_moves_author(self):
+        """Автор, перешедший порог, уходит из лент и возвращается в них."""
+        self.authorized_auth.force_login(self.user)
+        self.authorized_auth.get(self.FOLLOW_INDEX)
+        reader = Client()
+        reader.force_login(User.objects.create_user(username='reader'))
+        reader.get(reverse('posts:profile_follow',
+                           kwargs={'username': self.auth}))
+        self.assertFalse(
+            TimelineEntry.objects.filter(post=self.post).exists())
+        page_obj = self.authorized_auth.get(
+            self.FOLLOW_INDEX).context['page_obj']
+        self.assertEqual(list(page_obj), [self.post])
+        reader.get(reverse('posts:profile_unfollow',
+                           kwargs={'username': self.auth}))
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post=self.post).exists())
+
+    def test_author_stats_follow_writes(self):
+        """Статистика автора меняется при публикации и подписке."""
+        self.authorized_auth.get(self.PROFILE)
+        self.authorized_auth.post(self.POST_CREATE, {'text': 'Ещё пост'})
+        self.authorized_auth.force_login(self.user)
+        self.authorized_auth.get(reverse('posts:profile_unfollow',
+                                         kwargs={'username': self.auth}))
+        context = self.authorized_auth.get(self.PROFILE).context
+        self.assertEqual(
+            (context['stats'].posts_count, context['stats'].followers_count),
+            (2, 0))
+        self.assertEqual(context['page_obj'].paginator.count, 2)
+
     def test_cache_index(self):
         """Проверка хранения и очищения кэша для index."""
         posts = self.guest_client.get(self.INDEX).content
-        Post.objects.all().delete()
-        posts_del = self.guest_client.get(self.INDEX).content
-        self.assertEqual(posts_del, posts)
+        Post.objects.update(text='Правка в обход сигналов')
+        posts_cached = self.guest_client.get(self.INDEX).content
+        self.assertEqual(posts_cached, posts)
         cache.clear()
         posts_clear = self.guest_client.get(self.INDEX).content
-        self.assertNotEqual(posts_del, posts_clear)
+        self.assertNotEqual(posts_cached, posts_clear)
+
+    def test_cache_invalidated_by_changes(self):
+        """Изменение постов и комментариев сразу сбрасывает фрагменты."""
+        pages = (self.INDEX, self.GROUP_POSTS, self.PROFILE)
+        for page in pages:
+            self.guest_client.get(page)
+        Comment.objects.create(post=self.post, author=self.auth,
+                               text='Свежий коммит')
+        Post.objects.filter(pk=self.post.pk).update(comment_count=2)
+        for page in pages:
+            with self.subTest(page=page):
+                response = self.guest_client.get(page)
+                self.assertContains(
+                    response, 'количество комментариев к посту: 2')
+        Post.objects.get(pk=self.post.pk).delete()
+        for page in pages:
+            with self.subTest(page=page):
+                response = self.guest_client.get(page)
+                self.assertNotContains(response, self.post.text)
+
+    def test_post_card_cached_until_edit(self):
+        """Карточка поста живёт в кэше до правки самого поста."""
+        self.guest_client.get(self.INDEX)
+        Post.objects.filter(pk=self.post.pk).update(text='Тихая правка')
+        invalidate_feeds()
+        self.assertNotContains(self.guest_client.get(self.INDEX),
+                               'Тихая правка')
+        self.authorized_auth.post(self.POST_EDIT, {'text': 'Новый текст',
+                                                   'group': self.group.pk})
+        self.assertContains(self.guest_client.get(self.INDEX),
+                            'Новый текст')
+
+    def test_post_card_follows_group_rename(self):
+        """Переименование группы перерисовывает закэшированные карточки."""
+        self.guest_client.get(self.PROFILE)
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое название'
+        group.slug = 'new-slug'
+        group.save()
+        response = self.guest_client.get(self.PROFILE)
+        self.assertContains(response, 'Новое название')
+        self.assertContains(response, reverse(
+            'posts:group_posts_list', kwargs={'slug': 'new-slug'}))
+        self.assertNotContains(response, self.GROUP_POSTS)
+
+    def test_conditional_get(self):
+        """Неизменная страница отдаётся 304, изменённая - заново."""
+        pages = (self.INDEX, self.GROUP_POSTS, self.PROFILE, self.POST_DETAIL)
+        etags = {}
+        for page in pages:
+            response = self.guest_client.get(page)
+            etags[page] = response['ETag']
+            self.assertIn('Cookie', response['Vary'])
+            with self.subTest(page=page):
+                response = self.guest_client.get(
+                    page, HTTP_IF_NONE_MATCH=etags[page])
+                self.assertEqual(response.status_code, 304)
+                response = self.authorized_auth.get(
+                    page, HTTP_IF_NONE_MATCH=etags[page])
+                self.assertEqual(response.status_code, 200)
+        Comment.objects.create(post=self.post, author=self.auth,
+                               text='Свежий коммит')
+        for page in pages:
+            with self.subTest(page=page):
+                response = self.guest_client.get(
+                    page, HTTP_IF_NONE_MATCH=etags[page])
+                self.assertEqual(response.status_code, 200)
+
+    def test_conditional_get_post_detail_csrf(self):
+        """Новый CSRF-токен после повторного входа меняет ETag поста."""
+        etag = self.authorized_auth.get(self.POST_DETAIL)['ETag']
+        self.authorized_auth.logout()
+        self.authorized_auth.force_login(self.auth)
+        self.authorized_auth.cookies[settings.CSRF_COOKIE_NAME] = 'rotated'
+        response = self.authorized_auth.get(
+            self.POST_DETAIL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_conditional_get_profile_follow_state(self):
+        """Подписка меняет ETag профиля для подписавшегося."""
+        self.authorized_auth.force_login(self.user)
+        etag = self.authorized_auth.get(self.PROFILE)['ETag']
+        self.authorized_auth.get(reverse('posts:profile_unfollow',
+                                         kwargs={'username': self.auth}))
+        response = self.authorized_auth.get(
+            self.PROFILE, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
 
     def test_added_follow_in_database(self):
         """после успешной подписки, подписка появляется в базе."""
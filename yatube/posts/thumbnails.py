@@ -0,0 +1,282 @@
+"""Миниатюры картинок постов, заготовленные заранее.
+
+Картинка после post_create/post_edit ставится в очередь ThumbnailJob.
+Команда thumbnail_worker в пуле процессов нормализует оригинал
+(normalize), нарезает все размеры из SIZES и кладёт рядом с оригиналом
+адаптивные варианты (IMAGE_VARIANT_WIDTHS в JPEG и WebP), список
+которых пишется в Post.image_variants. Шаблоны только читают готовое
+и, если его ещё нет, показывают заглушку; Pillow в запросе не работает.
+"""
+import json
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import F
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.images import (
+    ImageFile, deserialize_image_file, serialize_image_file,
+)
+from sorl.thumbnail.kvstores.base import KVStoreBase, add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    EMPTY_VALUE, KVStore as CachedDBKVStore,
+)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from . import media
+from .caching import invalidate_feeds
+from .models import Post, ThumbnailJob
+
+# Размеры, которые выводят шаблоны: имя -> (геометрия, опции sorl).
+SIZES = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+MAX_ATTEMPTS = 3
+image_field = Post._meta.get_field('image')
+image_storage = image_field.storage
+# Опции пересохранения оригинала при нормализации.
+NORMALIZE_OPTIONS = {
+    'JPEG': {'quality': 85, 'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': 85},
+}
+# Форматы вариантов: (функция Pillow, расширение, MIME, опции сохранения).
+# Порядок важен: браузер берёт первый подходящий <source>.
+VARIANT_FORMATS = {
+    'WEBP': ('webp', 'webp', 'image/webp', {'quality': 75, 'method': 6}),
+    'JPEG': ('jpg', 'jpg', 'image/jpeg',
+             {'quality': 80, 'optimize': True, 'progressive': True}),
+}
+
+
+class ReadyThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl, который только ищет готовые миниатюры."""
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        """Файл миниатюры, которую нарезал бы get_thumbnail; без чтения."""
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        # Те же опции, что добавляет get_thumbnail: иначе имя не совпадёт.
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def lookup(self, file_, geometry_string, **options):
+        """Готовая миниатюра из kvstore или None."""
+        return default.kvstore.get(
+            self.thumbnail_file(file_, geometry_string, **options))
+
+
+backend = ReadyThumbnailBackend()
+
+
+class WorkerKVStore(KVStoreBase):
+    """kvstore процесса пула: в памяти и на одну задачу.
+
+    Процессы пула в базу не пишут: generate отдаёт записи kvstore, и
+    родитель сохраняет их в finish.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.data = {}
+
+    def _get_raw(self, key):
+        return self.data.get(key)
+
+    def _set_raw(self, key, value):
+        self.data[key] = value
+
+    def _delete_raw(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def _find_keys_raw(self, prefix):
+        return [key for key in self.data if key.startswith(prefix)]
+
+
+def ready(image, size):
+    """Готовая миниатюра картинки image размера size или None."""
+    if not image:
+        return None
+    geometry, options = SIZES[size]
+    return backend.lookup(image, geometry, **options)
+
+
+def ready_many(images, size):
+    """Готовые миниатюры страницы разом: {имя картинки: миниатюра}.
+
+    Для cached_db kvstore это один get_many к кэшу и один запрос к
+    таблице kvstore на промахи вместо обращения на каждую картинку.
+    """
+    geometry, options = SIZES[size]
+    keys = {
+        add_prefix(backend.thumbnail_file(
+            image, geometry, **options).key): image.name
+        for image in images if image
+    }
+    if not isinstance(default.kvstore, CachedDBKVStore):
+        return {name: backend.lookup(name, geometry, **options)
+                for name in keys.values()}
+    kv_cache = default.kvstore.cache
+    values = kv_cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        found = dict(KVStoreModel.objects.filter(
+            key__in=missing).values_list('key', 'value'))
+        fetched = {key: found.get(key, EMPTY_VALUE) for key in missing}
+        kv_cache.set_many(fetched, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(fetched)
+    return {
+        name: deserialize_image_file(values[key])
+        for key, name in keys.items() if values[key] != EMPTY_VALUE
+    }
+
+
+def enqueue(*names):
+    """Ставит картинки в очередь на нарезку миниатюр."""
+    ThumbnailJob.objects.bulk_create(
+        [ThumbnailJob(image=name) for name in names if name],
+        ignore_conflicts=True)
+
+
+def normalize(name):
+    """Приводит оригинал: поворот по EXIF, без метаданных, не больше
+    POST_IMAGE_NORMALIZED_SIDE по длинной стороне. Анимацию не трогает.
+
+    Хранилище адресуется содержимым, поэтому у приведённой картинки
+    новое имя; оно и возвращается. Старый файл убирает gc_media.
+    """
+    side = settings.POST_IMAGE_NORMALIZED_SIDE
+    with image_storage.open(name) as source:
+        image = Image.open(source)
+        if getattr(image, 'is_animated', False):
+            return name
+        if (max(image.size) <= side and not image.getexif()
+                and 'icc_profile' not in image.info):
+            return name
+        image_format = image.format
+        # JPEG сразу декодируется уменьшенным: меньше памяти и работы.
+        image.draft('RGB', (side, side))
+        image = ImageOps.exif_transpose(image)
+    image.thumbnail((side, side), Image.LANCZOS)
+    buffer = BytesIO()
+    image.save(buffer, image_format, **NORMALIZE_OPTIONS.get(image_format, {}))
+    upload_name = image_field.generate_filename(None, os.path.basename(name))
+    return image_storage.save(upload_name, ContentFile(buffer.getvalue()))
+
+
+def make_variants(name):
+    """Кладёт рядом с оригиналом варианты карточки всех ширин и форматов.
+
+    Ширины больше оригинала не делаются: растягивать нет смысла.
+    Формат, который не умеет сборка Pillow, пропускается. Варианты уже
+    нарезанного файла (та же картинка у другого поста) не пересчитываются.
+    """
+    with image_storage.open(name) as source:
+        image = Image.open(source)
+        image.load()
+    image = ImageOps.exif_transpose(image).convert('RGB')
+    card_width, card_height = map(int, SIZES['card'][0].split('x'))
+    widths = sorted(settings.IMAGE_VARIANT_WIDTHS)
+    widths = [width for width in widths if width <= image.width] or widths[:1]
+    root = os.path.splitext(name)[0]
+    variants = []
+    for image_format, (feature, ext, mime, params) in VARIANT_FORMATS.items():
+        if not features.check(feature):
+            continue
+        for width in widths:
+            height = round(width * card_height / card_width)
+            variant = f'{root}_{width}w.{ext}'
+            if not default_storage.exists(variant):
+                buffer = BytesIO()
+                ImageOps.fit(image, (width, height), Image.LANCZOS).save(
+                    buffer, image_format, **params)
+                variant = default_storage.save(
+                    variant, ContentFile(buffer.getvalue()))
+            variants.append({'name': variant, 'width': width,
+                             'height': height, 'type': mime})
+    return variants
+
+
+def variants(post):
+    """Разобранные варианты картинки поста; пусто, пока их нет."""
+    try:
+        return json.loads(post.image_variants or '[]')
+    except ValueError:
+        return []
+
+
+def generate(name):
+    """Нарезает все размеры картинки; выполняется в процессе пула.
+
+    Возвращает имя приведённой картинки, её варианты и записи kvstore
+    (исходник, затем миниатюры) для finish.
+    """
+    name = normalize(name)
+    source = ImageFile(name, image_storage)
+    made = []
+    for geometry, options in SIZES.values():
+        # sorl не бросает исключение на нечитаемый исходник.
+        thumbnail = get_thumbnail(source, geometry, **options)
+        if not thumbnail.exists():
+            raise FileNotFoundError(f'миниатюра {geometry} не создана')
+        made.append(thumbnail)
+    entries = [serialize_image_file(image)
+               for image in (default.kvstore.get(source), *made)]
+    if isinstance(default.kvstore, WorkerKVStore):
+        default.kvstore.data.clear()
+    return name, make_variants(name), entries
+
+
+def _record(entries):
+    """Пишет в kvstore записи, собранные generate."""
+    if not entries:
+        return
+    source, *made = map(deserialize_image_file, entries)
+    default.kvstore.set(source)
+    for thumbnail in made:
+        default.kvstore.set(thumbnail, source)
+
+
+def finish(job, error=None, image=None, image_variants=(), entries=()):
+    """Снимает задачу с очереди или записывает неудачную попытку."""
+    if error is None:
+        _record(entries)
+        job.delete()
+        _refresh_cards(job.image, image or job.image, image_variants)
+    else:
+        # После MAX_ATTEMPTS задача остаётся в очереди для разбора.
+        ThumbnailJob.objects.filter(pk=job.pk).update(
+            attempts=F('attempts') + 1, last_error=error)
+
+
+def pending():
+    """Задачи, которые ещё стоит пытаться выполнить."""
+    return ThumbnailJob.objects.filter(attempts__lt=MAX_ATTEMPTS)
+
+
+def _refresh_cards(name, new_name, image_variants):
+    """Посты переходят на приведённую картинку, а карточки с заглушкой
+    перерисовываются с готовой миниатюрой.
+    """
+    posts = Post.objects.filter(image=name)
+    feeds = list(posts.values_list('author__username', 'group__slug'))
+    count = posts.update(image=new_name, edited=timezone.now(),
+                         image_variants=json.dumps(image_variants))
+    media.move(name, new_name, count)
+    for username, slug in feeds:
+        invalidate_feeds(username, slug)
@@ -0,0 +1,193 @@
+"""Материализованные ленты подписок (fan-out on write).
+
+Пост при публикации раскладывается по лентам подписчиков автора,
+поэтому follow_index читает одну ленту диапазоном по индексу
+(user, -pub_date) вместо соединения Post с Follow. Лента хранит не
+больше settings.TIMELINE_SIZE последних постов: лишнее срезается при
+записи - раскладке поста и подписке, чтение ленту не меняет.
+
+Авторы, у которых подписчиков не меньше
+settings.FANOUT_FOLLOWER_THRESHOLD, в ленты не раскладываются: их
+свежие посты подмешиваются при чтении k-путевым слиянием. Когда автор
+переходит порог, его посты убираются из лент или раскладываются по ним
+(followers_changed).
+"""
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .models import AuthorStats, Follow, Post, TimelineBuilt, TimelineEntry
+from .paginators import POST_ORDERING
+
+BATCH_SIZE = 500
+# Порядок ленты по индексу (user, -pub_date, -post) TimelineEntry.
+TIMELINE_ORDERING = ('-pub_date', '-post_id')
+
+
+def _push(user_ids, posts):
+    """Вставляет пары (читатель, пост), пропуская уже имеющиеся."""
+    entries = [
+        TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for user_id in user_ids for post_id, pub_date in posts
+    ]
+    # Раскладка по тысячам подписчиков пишется INSERT-ами по BATCH_SIZE.
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def popular_authors(author_ids):
+    """Выбирает из авторов тех, чьи посты подмешиваются при чтении."""
+    return set(AuthorStats.objects.filter(
+        user_id__in=author_ids,
+        followers_count__gte=settings.FANOUT_FOLLOWER_THRESHOLD,
+    ).values_list('user_id', flat=True))
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if popular_authors([post.author_id]):
+        return
+    follower_ids = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    _push(follower_ids.iterator(), [(post.pk, post.pub_date)])
+    trim(follower_ids)
+
+
+def trim(user_ids):
+    """Оставляет в лентах читателей settings.TIMELINE_SIZE новейших постов.
+
+    Новизна - пара (pub_date, post_id), как при чтении ленты, поэтому
+    посты с одной датой на границе не срезаются лишними. Все ленты
+    обрезаются одним DELETE.
+    """
+    ranked = TimelineEntry.objects.filter(user_id__in=user_ids).annotate(
+        position=Window(
+            RowNumber(), partition_by=[F('user_id')],
+            order_by=[F('pub_date').desc(), F('post_id').desc()],
+        ),
+    ).order_by().values('pk', 'position')
+    sql, params = ranked.query.sql_with_params()
+    table = TimelineEntry._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE id IN (SELECT id FROM ({sql}) '
+            f'ranked WHERE position > %s)',
+            (*params, settings.TIMELINE_SIZE))
+
+
+def followers_changed(deltas):
+    """Переносит авторов, перешедших порог, между лентами и слиянием.
+
+    deltas - {author_id: сдвиг followers_count}, уже применённый к
+    AuthorStats. Ставший популярным автор убирается из лент: его посты
+    теперь подмешиваются при чтении. Переставший - раскладывается по
+    лентам всех своих подписчиков.
+    """
+    threshold = settings.FANOUT_FOLLOWER_THRESHOLD
+    counts = AuthorStats.objects.filter(user_id__in=deltas).values_list(
+        'user_id', 'followers_count')
+    for author_id, count in counts:
+        before = count - deltas[author_id]
+        if before < threshold <= count:
+            TimelineEntry.objects.filter(post__author_id=author_id).delete()
+        elif count < threshold <= before:
+            follower_ids = Follow.objects.filter(
+                author_id=author_id).values_list('user_id', flat=True)
+            posts = Post.objects.filter(author_id=author_id).order_by(
+                *POST_ORDERING).values_list(
+                    'pk', 'pub_date')[:settings.TIMELINE_SIZE]
+            _push(follower_ids.iterator(), list(posts))
+            trim(follower_ids)
+
+
+def follow(user, author):
+    """Досыпает в ленту свежие посты нового автора."""
+    if popular_authors([author.pk]):
+        return
+    posts = author.posts.order_by('-pub_date').values_list(
+        'pk', 'pub_date')[:settings.TIMELINE_SIZE]
+    _push([user.pk], posts)
+    trim([user.pk])
+
+
+def unfollow(user, author):
+    """Убирает из ленты посты автора, от которого отписались."""
+    TimelineEntry.objects.filter(user=user, post__author=author).delete()
+
+
+def rebuild(user, popular=None):
+    """Материализует ленту заново из подписок пользователя."""
+    TimelineEntry.objects.filter(user=user).delete()
+    if popular is None:
+        popular = popular_authors(
+            user.follower.values_list('author_id', flat=True))
+    author_ids = user.follower.exclude(author_id__in=popular).values_list(
+        'author_id', flat=True)
+    merged = heapq.merge(*_author_sources(author_ids), reverse=True)
+    _push([user.pk], [(post_id, pub_date) for pub_date, post_id in islice(
+        merged, settings.TIMELINE_SIZE)])
+    TimelineBuilt.objects.update_or_create(user_id=user.pk)
+
+
+def reset(user_ids):
+    """Сбрасывает ленты: они построятся заново при следующем чтении."""
+    TimelineEntry.objects.filter(user_id__in=user_ids).delete()
+    TimelineBuilt.objects.filter(user_id__in=user_ids).delete()
+
+
+def _author_sources(author_ids):
+    """Свежие (pub_date, id) постов каждого автора по его индексу.
+
+    Отдельный запрос на автора читает индекс (author, pub_date) по
+    порядку; общий запрос по всем авторам сортировал бы выборку.
+    """
+    return [
+        Post.objects.filter(author_id=author_id).order_by(
+            *POST_ORDERING).values_list('pub_date', 'pk')[
+                :settings.TIMELINE_SIZE]
+        for author_id in author_ids
+    ]
+
+
+def _merged_ids(user, popular):
+    """k-путевое слияние ленты и свежих постов популярных авторов."""
+    size = settings.TIMELINE_SIZE
+    sources = [
+        TimelineEntry.objects.filter(user=user).order_by(
+            *TIMELINE_ORDERING).values_list('pub_date', 'post_id')[:size],
+        *_author_sources(popular),
+    ]
+    # Пост автора, только что ставшего популярным, может ещё лежать в
+    # ленте: одинаковые пары идут в слиянии подряд.
+    post_ids = []
+    for _, post_id in heapq.merge(*sources, reverse=True):
+        if post_ids and post_ids[-1] == post_id:
+            continue
+        post_ids.append(post_id)
+        if len(post_ids) == size:
+            break
+    return post_ids
+
+
+def feed(user):
+    """Лента подписок: (queryset, порядок для пагинации).
+
+    Без популярных авторов это записи TimelineEntry читателя с постами,
+    иначе - сами посты после слияния. Лента строится один раз, при
+    первом чтении; дальше её меняют только записи.
+    """
+    popular = popular_authors(
+        user.follower.values_list('author_id', flat=True))
+    if not TimelineBuilt.objects.filter(user_id=user.pk).exists():
+        rebuild(user, popular)
+    if popular:
+        posts = Post.objects.select_related('author', 'group').filter(
+            pk__in=_merged_ids(user, popular))
+        return posts.order_by(*POST_ORDERING), POST_ORDERING
+    entries = TimelineEntry.objects.filter(user=user).select_related(
+        'post__author', 'post__group')
+    return entries.order_by(*TIMELINE_ORDERING), TIMELINE_ORDERING
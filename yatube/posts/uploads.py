@@ -0,0 +1,119 @@
+"""Загрузка картинок постов с жёстким пределом размера.
+
+LimitedUploadHandler считает байты файла по мере чтения тела запроса.
+После POST_IMAGE_MAX_BYTES он прерывает разбор тела StopUpload: остаток
+потока не читается, а bounded_uploads кладёт в request.FILES пустой
+OversizedUpload, и форма показывает ошибку.
+
+Обработчик должен встать в цепочку до первого чтения request.POST,
+поэтому вьюхи оборачиваются bounded_uploads: csrf_exempt снаружи и
+csrf_protect внутри, как советует документация Django.
+"""
+from functools import wraps
+
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import Image
+
+IMAGE_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+
+
+class OversizedUpload(UploadedFile):
+    """Файл, чтение которого остановлено на пределе размера."""
+
+    oversized = True
+
+    def __init__(self, name, content_type, size):
+        super().__init__(None, name, content_type, size)
+
+    def open(self, mode=None):
+        raise ValueError('Файл превысил предел размера и не сохранён.')
+
+
+class LimitedUploadHandler(FileUploadHandler):
+    oversized = None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.POST_IMAGE_MAX_BYTES:
+            self.oversized = OversizedUpload(
+                self.file_name, self.content_type, self.received)
+            # Остаток тела не нужен: клиенту можно рвать соединение.
+            raise StopUpload(connection_reset=True)
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+class HeaderCheckedImageField(forms.ImageField):
+    """ImageField, который не декодирует картинку при проверке.
+
+    Формат и размеры читаются из заголовка, целостность файла проверяет
+    verify(); копии файла в памяти нет, нормализацию делает
+    thumbnail_worker.
+    """
+    default_error_messages = {
+        'file_too_large': 'Файл больше %(limit)d МБ.',
+        'image_too_large': 'Картинка больше %(limit)d пикселей по стороне.',
+    }
+
+    def to_python(self, data):
+        if getattr(data, 'oversized', False):
+            raise ValidationError(
+                self.error_messages['file_too_large'], code='file_too_large',
+                params={'limit': settings.POST_IMAGE_MAX_BYTES // 2 ** 20})
+        # Разбор ImageField пропускается: он декодирует картинку целиком.
+        upload = super(forms.ImageField, self).to_python(data)
+        if upload is None:
+            return None
+        try:
+            # open() ленив: пикселей он не читает.
+            image = Image.open(upload)
+        except Exception as exc:
+            raise ValidationError(self.error_messages['invalid_image'],
+                                  code='invalid_image') from exc
+        if image.format not in IMAGE_FORMATS:
+            raise ValidationError(self.error_messages['invalid_image'],
+                                  code='invalid_image')
+        if max(image.size) > settings.POST_IMAGE_MAX_DIMENSION:
+            raise ValidationError(
+                self.error_messages['image_too_large'],
+                code='image_too_large',
+                params={'limit': settings.POST_IMAGE_MAX_DIMENSION})
+        try:
+            # Как у ImageField: битый файл отсекается без декодирования.
+            image.verify()
+        except Exception as exc:
+            raise ValidationError(self.error_messages['invalid_image'],
+                                  code='invalid_image') from exc
+        upload.image = image
+        upload.content_type = Image.MIME.get(image.format)
+        upload.seek(0)
+        return upload
+
+
+def bounded_uploads(view):
+    """Вьюха принимает файлы не больше POST_IMAGE_MAX_BYTES."""
+    protected = csrf_protect(view)
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        handler = LimitedUploadHandler(request)
+        request.upload_handlers.insert(0, handler)
+        if request.method == 'POST':
+            # Тело разбирается здесь, чтобы форма увидела прерванный файл.
+            files = request.FILES
+            if handler.oversized is not None:
+                files.appendlist(handler.field_name, handler.oversized)
+        return protected(request, *args, **kwargs)
+    return wrapper
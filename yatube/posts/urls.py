@@ -8,6 +8,7 @@ urlpatterns = [
     # Главная страница
     path('', views.index, name='index'),
     path('group/<slug:slug>/', views.group_posts, name='group_posts_list'),
+    path('tag/<str:name>/', views.tag_posts, name='tag_posts'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('create/', views.post_create, name='post_create'),
@@ -15,6 +16,9 @@ urlpatterns = [
     path('posts/<int:post_id>/del/', views.post_del, name='post_del'),
     path('follow/', views.follow_index, name='follow_index'),
     path('authors/', views.authors_index, name='authors_index'),
+    path('search/', views.search, name='search'),
+    path('autocomplete/', views.autocomplete, name='autocomplete'),
+    path('export/<str:kind>/', views.export, name='export'),
     path('profile/<str:username>/follow/', views.profile_follow,
          name='profile_follow'),
     path('profile/<str:username>/unfollow/', views.profile_unfollow,
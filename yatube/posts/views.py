@@ -2,24 +2,67 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.conf import settings
 from django.core.paginator import Paginator
 from django.contrib.auth.decorators import login_required
-
-from .models import Post, Group, Follow, Comment, User
-from .forms import PostForm, CommentForm
-
-
-def paginator_def(queryset, page_number):
-    return Paginator(queryset, settings.NUMB_POSTS).get_page(page_number)
-
-
+from django.db import transaction
+from django.db.models import F
+from django.http import (
+    Http404, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse,
+)
+from django.urls import reverse
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_cookie
+
+from core.cache import bump_generation
+from core.replicas import replica_reads
+from core.singleflight import cache_feed_page
+from .models import Post, Group, Follow, Comment, Tag, TimelineEntry, User
+from .forms import PostForm, CommentForm, SearchForm
+from .uploads import bounded_uploads
+from .paginators import CursorPaginator, POST_ORDERING, FOLLOW_ORDERING
+from . import (
+    autocomplete as post_autocomplete, exporting, search as post_search,
+    stats, tags, thumbnails, timelines,
+)
+from .conditional import (
+    group_etag, index_etag, post_detail_etag, profile_etag,
+)
+from .caching import (
+    INDEX_SCOPE, author_generation, author_scope, group_generation,
+    group_scope, index_generation,
+)
+
+
+def paginator_def(queryset, page_number, count=None):
+    paginator = Paginator(queryset, settings.NUMB_POSTS)
+    if count is not None:
+        # Известное заранее число объектов избавляет от COUNT(*).
+        paginator.count = count
+    return paginator.get_page(page_number)
+
+
+def feed_paginator(request, queryset, ordering=POST_ORDERING, count=None):
+    """Страница ленты: курсорная при ?cursor= или CURSOR_PAGINATION."""
+    cursor = request.GET.get('cursor')
+    if cursor is None and not settings.CURSOR_PAGINATION:
+        return paginator_def(queryset, request.GET.get('page'), count)
+    return CursorPaginator(
+        queryset, settings.NUMB_POSTS, ordering).page(cursor)
+
+
+@replica_reads
+@vary_on_cookie
+@condition(etag_func=index_etag)
+@cache_feed_page(lambda: INDEX_SCOPE)
 def index(request):
     template = 'posts/index.html'
     posts = Post.objects.select_related('author', 'group')
     context = {
-        'page_obj': paginator_def(posts, request.GET.get('page')),
+        'page_obj': feed_paginator(request, posts),
+        'generation': index_generation(),
     }
     return render(request, template, context)
 
 
+@replica_reads
 def authors_index(request):
     template = 'posts/authors_index.html'
     authors = User.objects.filter(
@@ -30,36 +73,107 @@ def authors_index(request):
     return render(request, template, context)
 
 
+def search(request):
+    template = 'posts/search.html'
+    form = SearchForm(request.GET or None)
+    page_obj = None
+    query_prefix = ''
+    if form.is_valid():
+        page_obj = post_search.search(
+            form.cleaned_data['q'], request.GET.get('cursor'),
+            settings.NUMB_POSTS, form.cleaned_data['group'],
+            form.cleaned_data['author'])
+        params = request.GET.copy()
+        params.pop('cursor', None)
+        query_prefix = params.urlencode() + '&'
+    context = {
+        'form': form,
+        'page_obj': page_obj,
+        'query_prefix': query_prefix,
+    }
+    return render(request, template, context)
+
+
+def autocomplete(request):
+    try:
+        limit = int(request.GET.get('limit', 0))
+    except ValueError:
+        limit = 0
+    usernames, groups = post_autocomplete.suggest(
+        request.GET.get('q', ''), limit)
+    return JsonResponse({
+        'users': [
+            {'username': username,
+             'url': reverse('posts:profile', args=(username,))}
+            for username in usernames
+        ],
+        'groups': [
+            {'slug': slug, 'title': title,
+             'url': reverse('posts:group_posts_list', args=(slug,))}
+            for slug, title in groups
+        ],
+    })
+
+
+@replica_reads
+@vary_on_cookie
+@condition(etag_func=group_etag)
+@cache_feed_page(group_scope)
 def group_posts(request, slug):
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
     posts = group.posts.select_related('author')
     context = {
         'group': group,
-        'page_obj': paginator_def(posts, request.GET.get('page')),
+        'page_obj': feed_paginator(request, posts),
+        'generation': group_generation(slug),
     }
     return render(request, template, context)
 
 
+def tag_posts(request, name):
+    template = 'posts/tag_list.html'
+    tag = get_object_or_404(Tag, name=tags.normalize(name))
+    # Страница выбирается по индексу (tag, -pub_date, -id) таблицы PostTag.
+    entries = tag.post_tags.select_related('post__author', 'post__group')
+    page_obj = feed_paginator(request, entries, tags.TAG_ORDERING)
+    page_obj.object_list = [entry.post for entry in page_obj.object_list]
+    context = {
+        'tag': tag,
+        'page_obj': page_obj,
+    }
+    return render(request, template, context)
+
+
+@replica_reads
+@vary_on_cookie
+@condition(etag_func=profile_etag)
+@cache_feed_page(author_scope)
 def profile(request, username):
     template = 'posts/profile.html'
     author = get_object_or_404(User, username=username)
     posts = author.posts.select_related('group')
     following = (request.user.is_authenticated and author.following.filter(
         user=request.user).exists())
+    author_stats = stats.get_stats(author)
     context = {
         'author': author,
-        'page_obj': paginator_def(posts, request.GET.get('page')),
+        'stats': author_stats,
+        'page_obj': feed_paginator(
+            request, posts, count=author_stats.posts_count),
         'following': following,
+        'generation': author_generation(author.username),
     }
     return render(request, template, context)
 
 
+@vary_on_cookie
+@condition(etag_func=post_detail_etag)
 def post_detail(request, post_id):
     template = 'posts/post_detail.html'
     post = get_object_or_404(
         Post.objects.select_related('author', 'group'), pk=post_id)
-    post_count = post.author.posts.count()
+    post_count = stats.get_stats(post.author).posts_count
     comments = post.comments.select_related('author')
     context = {
         'post_count': post_count,
@@ -71,6 +185,7 @@ def post_detail(request, post_id):
 
 
 @login_required
+@bounded_uploads
 def post_edit(request, post_id):
     post = get_object_or_404(
         Post.objects.select_related('author', 'group'), pk=post_id)
@@ -80,7 +195,14 @@ def post_edit(request, post_id):
             files=request.FILES or None,
             instance=post,)
         if form.is_valid():
+            image_changed = 'image' in form.changed_data
+            if image_changed:
+                post.image_variants = ''
             form.save()
+            if 'text' in form.changed_data:
+                tags.sync(post)
+            if image_changed:
+                thumbnails.enqueue(post.image.name)
             return redirect('posts:post_detail', post_id)
         template = 'posts/edit_post.html'
         context = {
@@ -91,12 +213,17 @@ def post_edit(request, post_id):
 
 
 @login_required
+@bounded_uploads
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None,)
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        tags.sync(post)
+        stats.bump(request.user.pk, posts_count=1)
+        timelines.fan_out(post)
+        thumbnails.enqueue(post.image.name)
         return redirect('posts:profile', request.user)
     template = 'posts/create_post.html'
     context = {
@@ -110,6 +237,7 @@ def post_del(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     if post.author == request.user:
         post.delete()
+        stats.bump(request.user.pk, posts_count=-1)
     return redirect('posts:profile', request.user)
 
 
@@ -121,35 +249,59 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        with transaction.atomic():
+            comment.save()
+            Post.objects.filter(pk=post.pk).update(
+                comment_count=F('comment_count') + 1)
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def del_comment(request, comment_id):
     comment = get_object_or_404(Comment, pk=comment_id)
-    post_id = comment.post.pk
+    post_id = comment.post_id
     if comment.author == request.user:
-        comment.delete()
+        with transaction.atomic():
+            comment.delete()
+            # У комментария удалённого поста post=NULL: счётчик ушёл с постом.
+            if post_id is not None:
+                Post.objects.filter(pk=post_id, comment_count__gt=0).update(
+                    comment_count=F('comment_count') - 1)
+    if post_id is None:
+        return redirect('posts:profile', request.user)
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.select_related(
-        'author', 'group').filter(author_id__following__user=request.user)
+    entries, ordering = timelines.feed(request.user)
+    page_obj = feed_paginator(request, entries, ordering)
+    if entries.model is TimelineEntry:
+        page_obj.object_list = [entry.post for entry in page_obj.object_list]
     template = 'posts/follow.html'
     context = {
-        'page_obj': paginator_def(posts, request.GET.get('page')),
+        'page_obj': page_obj,
     }
     return render(request, template, context)
 
 
+def _follows_changed(user, author):
+    """Счётчики подписок выводятся на страницах обоих профилей."""
+    bump_generation(author_scope(user.username), author_scope(author.username))
+
+
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if author != request.user:
-        Follow.objects.get_or_create(user=request.user, author=author)
+        _, created = Follow.objects.get_or_create(
+            user=request.user, author=author)
+        if created:
+            stats.bump(author.pk, followers_count=1)
+            stats.bump(request.user.pk, followings_count=1)
+            timelines.follow(request.user, author)
+            timelines.followers_changed({author.pk: 1})
+            _follows_changed(request.user, author)
     return redirect('posts:profile', author.username)
 
 
@@ -157,6 +309,11 @@ def profile_follow(request, username):
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     Follow.objects.get(user=request.user, author=author).delete()
+    stats.bump(author.pk, followers_count=-1)
+    stats.bump(request.user.pk, followings_count=-1)
+    timelines.unfollow(request.user, author)
+    timelines.followers_changed({author.pk: -1})
+    _follows_changed(request.user, author)
     return redirect('posts:profile', author.username)
 
 
@@ -165,8 +322,10 @@ def author_followings(request, username):
     template = 'posts/following.html'
     author = get_object_or_404(User, username=username)
     followings = author.following.select_related('user')
+    count = stats.get_stats(author).followers_count
     context = {
-        'page_obj': paginator_def(followings, request.GET.get('page')),
+        'page_obj': feed_paginator(
+            request, followings, FOLLOW_ORDERING, count),
         'author': author,
     }
     return render(request, template, context)
@@ -177,8 +336,31 @@ def author_followers(request, username):
     template = 'posts/follower.html'
     author = get_object_or_404(User, username=username)
     followers = author.follower.select_related('user')
+    count = stats.get_stats(author).followings_count
     context = {
-        'page_obj': paginator_def(followers, request.GET.get('page')),
+        'page_obj': feed_paginator(
+            request, followers, FOLLOW_ORDERING, count),
         'author': author,
     }
     return render(request, template, context)
+
+
+@login_required
+def export(request, kind):
+    """Посты или комментарии пользователя файлом JSONL или CSV."""
+    spec = exporting.EXPORTS.get(kind)
+    if spec is None:
+        raise Http404('Нет такой выгрузки.')
+    fmt = request.GET.get('format', 'jsonl')
+    if fmt not in exporting.CONTENT_TYPES:
+        return HttpResponseBadRequest('Неизвестный формат.')
+    try:
+        rows = spec.rows(request.GET.get('cursor'), author=request.user)
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    response = StreamingHttpResponse(
+        exporting.lines(spec, fmt, rows),
+        content_type=exporting.CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = (
+        f'attachment; filename="{kind}.{fmt}"')
+    return response
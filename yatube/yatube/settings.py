@@ -38,6 +38,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.replicas.ReplicaStickinessMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -80,6 +81,42 @@ DATABASES = {
     }
 }
 
+# PRAGMA, которые core.db выполняет на каждом новом соединении SQLite
+SQLITE_PRAGMAS = {}
+SQLITE_PRODUCTION_PRAGMAS = {
+    # Читатели не ждут писателя, а писатель - читателей.
+    'journal_mode': 'wal',
+    # В WAL fsync только на checkpoint: коммит не теряет целостность.
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение - в КиБ: 64 МБ страничного кэша.
+    'cache_size': -64 * 1024,
+    'busy_timeout': 5000,
+    'temp_store': 'memory',
+}
+
+# SQLITE_PROFILE=production: PRAGMA выше и постоянные соединения.
+
+if os.getenv('SQLITE_PROFILE') == 'production':
+    SQLITE_PRAGMAS = SQLITE_PRODUCTION_PRAGMAS
+    DATABASES['default']['CONN_MAX_AGE'] = 600
+
+# Базы только для чтения лент (core.replicas)
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+REPLICA_DATABASES = []
+
+# SQLITE_REPLICA=<путь>: второй файл SQLite как реплика; его обновляет
+# команда sync_replica.
+
+if os.getenv('SQLITE_REPLICA'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv('SQLITE_REPLICA'),
+        'CONN_MAX_AGE': DATABASES['default'].get('CONN_MAX_AGE', 0),
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES = ['replica']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -126,6 +163,42 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 # Project constants
 
 NUMB_POSTS = 10
+# Курсорная пагинация лент по умолчанию (иначе только по ?cursor=)
+CURSOR_PAGINATION = False
+# Сколько последних постов хранится в ленте подписок пользователя
+TIMELINE_SIZE = 500
+# С какого числа подписчиков посты автора подмешиваются при чтении
+FANOUT_FOLLOWER_THRESHOLD = 10000
+# Сколько живёт отрисованная карточка поста в кэше, секунд
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+# Сколько живёт страница ленты для анонимов, секунд (0 - не кэшировать)
+FEED_VIEW_CACHE_TIMEOUT = 0
+# Ширины адаптивных вариантов картинки поста (JPEG и WebP), px
+IMAGE_VARIANT_WIDTHS = (320, 640, 960)
+# Атрибут sizes у картинки в карточке поста
+IMAGE_VARIANT_SIZES = '(max-width: 992px) 100vw, 960px'
+# Предел размера загружаемой картинки поста, байт
+POST_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+# Предел стороны загружаемой картинки по её заголовку, px
+POST_IMAGE_MAX_DIMENSION = 10000
+# Длинная сторона картинки после нормализации в thumbnail_worker, px
+POST_IMAGE_NORMALIZED_SIDE = 2560
+# Раздавать MEDIA_URL вьюхой core.media.serve_media
+SERVE_MEDIA = True
+# Сколько браузер и прокси держат медиафайл без перепроверки, секунд
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24 * 365
+# Отдача тела прокси: '' (сами), 'x-accel-redirect' (nginx), 'x-sendfile'
+MEDIA_SENDFILE = os.getenv('MEDIA_SENDFILE', '')
+# internal-location nginx для X-Accel-Redirect
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+# Сколько подсказок отдаёт автодополнение имён и групп
+AUTOCOMPLETE_LIMIT = 10
+# Сколько секунд после записи пользователь читает ленты из default
+REPLICA_STICKY_SECONDS = 15
+# До скольких строк списки админки считаются точно, дальше - оценка
+ADMIN_EXACT_COUNT_LIMIT = 10000
+# Сколько строк читать одним запросом при выгрузке постов и комментариев
+EXPORT_BATCH_SIZE = 1000
 NUMBER_CHARACTERS = 15
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -148,3 +221,25 @@ CACHES = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
+
+# CACHE_BACKEND=two_tier: LRU в памяти процесса перед общим файловым
+# кэшем, согласованным между процессами по штампам версий.
+
+if os.getenv('CACHE_BACKEND') == 'two_tier':
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache_backends.TwoTierCache',
+            'OPTIONS': {
+                'SHARED': 'shared',
+                'LOCAL_TIMEOUT': 5,
+                'LOCAL_MAX_ENTRIES': 1000,
+                'LOCAL_MAX_BYTES': 16 * 1024 * 1024,
+            },
+        },
+        'shared': {
+            'BACKEND': 'core.cache_backends.AtomicFileBasedCache',
+            'LOCATION': os.getenv(
+                'SHARED_CACHE_DIR', os.path.join(BASE_DIR, 'cache')),
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        },
+    }
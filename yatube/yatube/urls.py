@@ -14,9 +14,10 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+
+from core.media import serve_media
 
 urlpatterns = [
     path('', include('posts.urls', namespace='posts')),
@@ -27,11 +28,12 @@ urlpatterns = [
 ]
 handler404 = 'core.views.page_not_found'
 handler403 = 'core.views.csrf_failure'
+if settings.SERVE_MEDIA:
+    urlpatterns += (re_path(
+        r'^%s(?P<path>.+)$' % settings.MEDIA_URL.lstrip('/'), serve_media,
+        name='media'),)
 if settings.DEBUG:
     import debug_toolbar
-    urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
-    )
     urlpatterns += (path('__debug__/', include(debug_toolbar.urls)),)
 if settings.ADMIN_ENABLED:
     urlpatterns += (path('admin/', admin.site.urls),)